@@ -1,101 +1,324 @@
 import argparse
+import dataclasses
+import importlib.util
 import json
 import datetime
 
-import GUI
-import Data
-import Plotting
+import Profiling
 
+# GUI, Data, History and Plotting import PySimpleGUI, NumPy, PyYAML and Plotly. They are imported only when they are
+# needed so that printing help, reporting invalid arguments and other runs without drawing start quickly.
 
-parser: argparse.ArgumentParser
-args: argparse.Namespace
+# Formats that charts can be exported to
+image_formats: tuple[str, ...] = ("png", "jpg", "webp", "svg", "pdf")
 
-file_name: str
-graphs: str
-totals: str
-ignored_stats: list
-searched_stats: list
-minimum_labeling_percentage: float
-start_date: datetime.date
-end_date: datetime.date
-gui: bool
 
+@dataclasses.dataclass
+class Options:
+    """Data class for storing options given as arguments or with the GUI.
 
-def initialize_parser() -> None:
-    """Initialize argparse parser."""
-    global parser
+    :ivar file_name: Path to file with statistics.
+    :ivar graphs: Letters of the types of stats to show daily statistics for.
+    :ivar totals: Letters of the types of stats to show total times for.
+    :ivar ignored_stats: Labels to leave out.
+    :ivar searched_stats: Labels to read. If empty, all labels that are not ignored are read.
+    :ivar case_insensitive: Whether to ignore the case of the letters in ignored and searched labels.
+    :ivar minimum_labeling_percentage: Stats with lesser percentage are added together under the label Other.
+    :ivar top_labels: Number of labels with the most time to keep. The rest are added together under the label Other.
+                      If 0, the number of labels is not limited.
+    :ivar top_labels_per_period: Number of labels with the most time in each day, week or month to keep in graphs. The
+                                 rest are added together under the label Other. If 0, the number is not limited.
+    :ivar start_date: First date to read (inclusive).
+    :ivar end_date: Last date to read (inclusive).
+    :ivar gui: Whether to use graphical user interface.
+    :ivar cache: Whether to read and write cached stats.
+    :ivar ingest_store: History store to add the days of the file to, or an empty string.
+    :ivar colors_file_name: YAML file with colors that replace or add to the default colors, or an empty string.
+    :ivar breakdown: Period to print total times for (week, month or year), or an empty string to draw instead.
+    :ivar resample: Period to add up daily statistics for in graphs: day, week or month.
+    :ivar maximum_points: Maximum number of points for each line in graphs, or 0 for no limit.
+    :ivar profile: Whether to print measurements of each stage.
+    :ivar profile_output: File to write measurements of each stage to, or an empty string.
+    :ivar html_file_name: HTML file to write all charts into instead of showing them, or an empty string.
+    :ivar export_directory: Directory to render all charts into as images, or an empty string.
+    :ivar export_name: Pattern for the names of the images with the fields type, kind and index.
+    :ivar export_formats: Formats of the images, such as png, svg and pdf.
+    :ivar watch: Whether to write the output again whenever the file changes.
+    :ivar port: Port to serve the stats of the files in FILE at, or 0 to not serve them.
+    :ivar batch_paths: Files and directories of several users to read together, or an empty list.
+    :ivar compact: Whether to store the hours as 32-bit floats to use less memory.
+    :ivar jobs: Number of processes to read the files of several users with and number of images to render at a time,
+                or 0 for the number of processors.
+    """
+    file_name: str = ""
+    graphs: str = ""
+    totals: str = ""
+    ignored_stats: list[str] = dataclasses.field(default_factory=list)
+    searched_stats: list[str] = dataclasses.field(default_factory=list)
+    case_insensitive: bool = False
+    minimum_labeling_percentage: float = 0.0
+    top_labels: int = 0
+    top_labels_per_period: int = 0
+    start_date: datetime.date = datetime.date(1, 1, 1)
+    end_date: datetime.date = datetime.date(9999, 12, 31)
+    gui: bool = False
+    cache: bool = True
+    ingest_store: str = ""
+    colors_file_name: str = ""
+    breakdown: str = ""
+    resample: str = "day"
+    maximum_points: int = 0
+    profile: bool = False
+    profile_output: str = ""
+    html_file_name: str = ""
+    export_directory: str = ""
+    export_name: str = "{type}-{kind}"
+    export_formats: list[str] = dataclasses.field(default_factory=lambda: ["png"])
+    watch: bool = False
+    port: int = 0
+    batch_paths: list[str] = dataclasses.field(default_factory=list)
+    jobs: int = 0
+    compact: bool = False
 
+
+def initialize_parser() -> argparse.ArgumentParser:
+    """Initialize argparse parser.
+
+    :return: Parser.
+    """
     parser = argparse.ArgumentParser(description="You can use this program to show your statistics from WakaTime.",
                                      usage=("python WakaFree.py {-h | -G | [-g GRAPHS] [-t TOTALS]"
-                                            " [{-i IGNORE | -s SEARCH}] [-m MINIMUM_LABELING_PERCENTAGE]"
-                                            " [--start-date START_DATE] [--end-date END_DATE] FILE}"))
+                                            " [{-i IGNORE | -s SEARCH}] [--case-insensitive]"
+                                            " [-m MINIMUM_LABELING_PERCENTAGE] [--top TOP]"
+                                            " [--top-per-period TOP_PER_PERIOD] [--start-date START_DATE]"
+                                            " [--end-date END_DATE] [--no-cache]"
+                                            " [--ingest STORE] [--colors COLORS] [--breakdown {week,month,year}]"
+                                            " [--resample {day,week,month}] [--max-points MAX_POINTS] [--profile]"
+                                            " [--profile-output PROFILE_OUTPUT] [--html HTML]"
+                                            " [--export-dir EXPORT_DIR [--export-name EXPORT_NAME]"
+                                            " [--export-format EXPORT_FORMAT]] [--watch] [--serve PORT]"
+                                            " [--batch [--jobs JOBS]] [--compact] FILE...}"))
 
-    parser.add_argument("file", metavar="FILE", nargs="?", default="", help="path to file with statistics")
+    parser.add_argument("file", metavar="FILE", nargs="*",
+                        help="path to file with statistics (with --batch, any number of files and directories)")
     parser.add_argument("-G", "--gui", action="store_true", help="use graphical user interface")
     parser.add_argument("-g", "--graphs",
                         help="show daily statistics: string with l, e, o for languages, editors, operating systems")
     parser.add_argument("-t", "--totals",
                         help="show total times: string with l, e, o for languages, editors, operating systems")
-    parser.add_argument("-i", "--ignore", help="ignored stats: string with labels separated by commas (without spaces)")
+    parser.add_argument("-i", "--ignore",
+                        help="ignored stats: string with labels, glob patterns such as Java* or regular expressions"
+                             " starting with re: separated by commas (without spaces)")
     parser.add_argument("-s", "--search",
-                        help="stats to search for: string with labels separated by commas (without spaces)")
+                        help="stats to search for: string with labels, glob patterns such as Java* or regular"
+                             " expressions starting with re: separated by commas (without spaces)")
+    parser.add_argument("--case-insensitive", action="store_true",
+                        help="ignore the case of the letters in ignored and searched stats")
     parser.add_argument("-m", "--minimum-labeling-percentage",
                         help="add together (under label Other) stats with lesser percentage than the given value")
+    parser.add_argument("--top", type=int, default=0,
+                        help="add together (under label Other) all but the given number of stats with the most time")
+    parser.add_argument("--top-per-period", type=int, default=0,
+                        help="in graphs, add together (under label Other) all but the given number of stats with the"
+                             " most time in each day, week or month")
     parser.add_argument("--start-date", help="start date in format YYYY-MM-DD (inclusive)")
     parser.add_argument("--end-date", help="end date in format YYYY-MM-DD (inclusive)")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write cached stats")
+    parser.add_argument("--colors", help="YAML file with colors that replace or add to the default colors")
+    parser.add_argument("--breakdown", choices=["week", "month", "year"],
+                        help="print total times for each week, month or year instead of drawing")
+    parser.add_argument("--resample", choices=["day", "week", "month"], default="day",
+                        help="add up daily statistics for each week or month in graphs")
+    parser.add_argument("--max-points", type=int, default=0,
+                        help="maximum number of points for each line in graphs (0 for no limit)")
+    parser.add_argument("--profile", action="store_true",
+                        help="print time, calls and peak memory of each stage")
+    parser.add_argument("--profile-output", help="write time and peak memory of each stage to a trace file")
+    parser.add_argument("--ingest", metavar="STORE",
+                        help="add new and changed days from FILE to history store STORE (.jsonl) instead of drawing")
+    parser.add_argument("--html", help="write all charts into one HTML file that works offline instead of showing them")
+    parser.add_argument("--export-dir", help="render all charts into image files in the given directory")
+    parser.add_argument("--export-name", default="{type}-{kind}",
+                        help="names of the image files: string with {type}, {kind} and {index} (without extension)")
+    parser.add_argument("--export-format", default="png",
+                        help="formats of the image files: string with png, jpg, webp, svg or pdf separated by commas")
+    parser.add_argument("--watch", action="store_true",
+                        help="write the output again whenever FILE changes (with --html, --export-dir or --breakdown)")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="serve the stats of the files in directory FILE to the browser at http://127.0.0.1:PORT/")
+    parser.add_argument("--batch", action="store_true",
+                        help="read the files of several users in parallel and show the stats of the whole team")
+    parser.add_argument("--jobs", type=int, default=0,
+                        help="number of processes used with --batch and images rendered at a time with --export-dir"
+                             " (0 for the number of processors)")
+    parser.add_argument("--compact", action="store_true",
+                        help="store daily hours as 32-bit floats to halve the memory used by the stats")
 
+    return parser
 
-def parse() -> None:
-    """Parse arguments."""
-    global args
-    global file_name
-    global graphs
-    global totals
-    global ignored_stats
-    global searched_stats
-    global minimum_labeling_percentage
-    global start_date
-    global end_date
-    global gui
-
-    initialize_parser()
-    args = parser.parse_args()
 
-    # Argument values
-    file_name = args.file if args.file else ""
-    graphs = args.graphs if args.graphs else ""
-    totals = args.totals if args.totals else ""
-    ignored_stats = args.ignore.split(",") if args.ignore else []
-    searched_stats = args.search.split(",") if args.search else []
-    minimum_labeling_percentage = float(args.minimum_labeling_percentage) if args.minimum_labeling_percentage else 0.0
+def parse_options(args: argparse.Namespace) -> Options:
+    """Get options from parsed arguments.
+
+    :param args: Parsed arguments.
+    :return: Options.
+    """
     start_date = datetime.date(int(args.start_date[0:4]), int(args.start_date[5:7]), int(args.start_date[8:10]))\
         if args.start_date else datetime.date(1, 1, 1)
     end_date = datetime.date(int(args.end_date[0:4]), int(args.end_date[5:7]), int(args.end_date[8:10]))\
         if args.end_date else datetime.date(9999, 12, 31)
-    gui = True if args.gui else False
 
-    # Read values with GUI if user wants to
-    if gui:
-        GUI.show()
+    return Options(file_name=args.file[0] if args.file and not args.batch else "",
+                   graphs=args.graphs if args.graphs else "",
+                   totals=args.totals if args.totals else "",
+                   ignored_stats=args.ignore.split(",") if args.ignore else [],
+                   searched_stats=args.search.split(",") if args.search else [],
+                   case_insensitive=True if args.case_insensitive else False,
+                   minimum_labeling_percentage=float(args.minimum_labeling_percentage)
+                   if args.minimum_labeling_percentage else 0.0,
+                   top_labels=args.top,
+                   top_labels_per_period=args.top_per_period,
+                   start_date=start_date,
+                   end_date=end_date,
+                   gui=True if args.gui else False,
+                   cache=not args.no_cache,
+                   ingest_store=args.ingest if args.ingest else "",
+                   colors_file_name=args.colors if args.colors else "",
+                   breakdown=args.breakdown if args.breakdown else "",
+                   resample=args.resample,
+                   maximum_points=args.max_points,
+                   profile=True if args.profile else False,
+                   profile_output=args.profile_output if args.profile_output else "",
+                   html_file_name=args.html if args.html else "",
+                   export_directory=args.export_dir if args.export_dir else "",
+                   export_name=args.export_name,
+                   export_formats=args.export_format.lower().split(","),
+                   watch=True if args.watch else False,
+                   port=args.serve if args.serve else 0,
+                   batch_paths=args.file if args.batch else [],
+                   jobs=args.jobs,
+                   compact=True if args.compact else False)
+
+
+def parse() -> None:
+    """Parse arguments and execute command specified by them."""
+    parser = initialize_parser()
+    args = parser.parse_args()
+    if len(args.file) > 1 and not args.batch:
+        parser.error("more than one FILE can be given only with --batch")
+    for patterns in (args.ignore, args.search):
+        if patterns and "re:" in patterns:
+            import Data
+            try:
+                Data.compile_patterns(tuple(patterns.split(",")), 0)
+            except ValueError as error:
+                parser.error(str(error))
+    if args.max_points < 0 or 0 < args.max_points < 3:
+        parser.error("--max-points must be 0 (no limit) or at least 3")
+    if args.top < 0 or args.top_per_period < 0 or args.jobs < 0:
+        parser.error("--top, --top-per-period and --jobs cannot be negative")
+    if args.export_dir and importlib.util.find_spec("kaleido") is None:
+        parser.error("--export-dir requires Kaleido. Install it with: pip install kaleido")
+    for image_format in args.export_format.lower().split(","):
+        if image_format not in image_formats:
+            parser.error("unknown --export-format {0} (choose from {1})".format(image_format, ", ".join(image_formats)))
+    try:
+        args.export_name.format(type="languages", kind="graphs", index=1)
+    except (KeyError, IndexError, ValueError, AttributeError) as error:
+        parser.error("invalid --export-name {0}: use only the fields {{type}}, {{kind}} and {{index}} ({1})"
+                     .format(args.export_name, error))
+    if args.export_dir:
+        import Plotting
+        problem = Plotting.find_image_export_problem()
+        if problem != "":
+            parser.error("--export-dir cannot render images: {0}".format(problem))
+    if args.watch and (args.batch or args.ingest or not (args.html or args.export_dir or args.breakdown)):
+        parser.error("--watch requires --html, --export-dir or --breakdown and cannot be used with --batch or --ingest")
+    options = parse_options(args)
+
+    # Start measuring stages
+    if options.profile or options.profile_output != "":
+        Profiling.enable()
+
+    # Read values and process stats with GUI if user wants to
+    if options.gui:
+        import GUI
+        GUI.show(options)
+    else:
+        execute_command(options)
+
+    # Show measurements
+    if options.profile:
+        print(Profiling.format_summary())
+    if options.profile_output != "":
+        Profiling.write_trace(options.profile_output)
+
+
+@Profiling.Stage("total")
+def execute_command(options: Options) -> None:
+    """Execute command specified by options.
+
+    :param options: Options given as arguments or with the GUI.
+    """
+
+    # User wants to add stats from a file to a history store
+    if options.file_name != "" and options.ingest_store != "":
+        import History
+        added_days, updated_days = History.ingest(options.file_name, options.ingest_store)
+        print("Added {0} and updated {1} days in {2}.".format(added_days, updated_days, options.ingest_store))
 
-    execute_command()
+    # User specified files of several users
+    elif len(options.batch_paths) > 0:
+        import Batch
+        import Data
 
+        # Read files in parallel and add their stats together
+        batch = Batch.read_batch(options.batch_paths, options)
 
-def execute_command() -> None:
-    """Execute command specified by arguments."""
+        # Print total times of each user
+        for type_ in batch.team.stats.keys():
+            print(Batch.format_team_totals(batch, type_), end="\n\n")
+
+        # Print total times of the team for each period
+        if options.breakdown != "":
+            for stats in batch.team.stats.values():
+                print(Data.format_breakdown(batch.team, stats, options.breakdown), end="\n\n")
+
+        # Plot data of the team
+        else:
+            import Plotting
+            Plotting.plot(batch.team)
+
+    # User wants to explore the stats in the browser
+    elif options.file_name != "" and options.port != 0:
+        import Server
+        Server.serve(options)
+
+    # User wants to update the output whenever the file changes
+    elif options.file_name != "" and options.watch:
+        import Watch
+        Watch.watch(options)
 
     # User specified a file
-    if file_name != "":
+    elif options.file_name != "":
+        import Data
 
         # Read and process stats
-        Data.read_stats(file_name)
+        analysis = Data.read_stats(options.file_name, options)
+
+        # Print total times for each period
+        if options.breakdown != "":
+            for stats in analysis.stats.values():
+                print(Data.format_breakdown(analysis, stats, options.breakdown), end="\n\n")
 
         # Plot data
-        Plotting.plot()
+        else:
+            import Plotting
+            Plotting.plot(analysis)
 
     # User did not give a file or an optional argument
     else:
-        if not gui:
+        if not options.gui:
             print("\n"
                   "You did not specify what you would like to do."
                   " To get help, try using either of the following commands:\n\n"
@@ -0,0 +1,153 @@
+import concurrent.futures
+import dataclasses
+import itertools
+import os.path
+
+import numpy as np
+
+import Args
+import Data
+import Profiling
+
+
+# Files with these extensions are read from directories given in batch mode
+export_file_extensions: tuple[str, ...] = tuple(extension + compression_extension
+                                                for extension in (".json", ".jsonl")
+                                                for compression_extension in ("", ".gz", ".bz2", ".xz")) + (".zip",)
+
+
+@dataclasses.dataclass
+class Batch:
+    """Data class for storing stats of several WakaTime JSON files.
+
+    :ivar user_names: Name of each user, taken from the file name.
+    :ivar exports: All stats of each user, with the dates and labels of that user.
+    :ivar merged: All stats of all users added together, with the dates and labels of all users.
+    :ivar team: Processed stats of all users added together.
+    """
+    user_names: list[str] = dataclasses.field(default_factory=list)
+    exports: list[Data.Export] = dataclasses.field(default_factory=list)
+    merged: Data.Export = dataclasses.field(default_factory=Data.Export)
+    team: Data.Analysis = dataclasses.field(default_factory=Data.Analysis)
+
+
+def find_export_files(paths: list[str]) -> list[str]:
+    """Find the files to read in batch mode.
+
+    :param paths: Paths of files and directories. Directories are not searched recursively.
+    :return: Paths of the given files and the files in the given directories, in order.
+    """
+    file_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            file_paths.extend(sorted(entry.path for entry in os.scandir(path)
+                                     if entry.is_file() and entry.name.lower().endswith(export_file_extensions)))
+        else:
+            file_paths.append(path)
+    return file_paths
+
+
+def get_user_names(file_paths: list[str]) -> list[str]:
+    """Name users after their files.
+
+    :param file_paths: WakaTime JSON file paths.
+    :return: File name without the extension for each file. Repeated names get a number after them.
+    """
+    user_names = []
+    for file_path in file_paths:
+        # Leave out the extensions of compressed files too
+        file_name = os.path.basename(file_path)
+        for extension in (".gz", ".bz2", ".xz", ".zip", ".jsonl", ".json"):
+            if file_name.lower().endswith(extension):
+                file_name = file_name[:-len(extension)]
+
+        user_name = file_name
+        number = 2
+        while user_name in user_names:
+            user_name = "{0} ({1})".format(file_name, number)
+            number += 1
+        user_names.append(user_name)
+    return user_names
+
+
+@Profiling.Stage("read_exports")
+def read_exports(file_paths: list[str], cache: bool = True, jobs: int = 0, compact: bool = False) -> list[Data.Export]:
+    """Read all stats from several WakaTime JSON files in parallel.
+
+    :param file_paths: WakaTime JSON file paths.
+    :param cache: Whether to read and write cached stats.
+    :param jobs: Number of processes to read the files with, or 0 for the number of processors.
+    :param compact: Whether to store the hours as 32-bit floats.
+    :return: Dates and stats of all types for each file, in the same order as the paths.
+    """
+    # Starting processes is not worth it for a single file
+    if len(file_paths) <= 1 or jobs == 1:
+        return [Data.read_export(file_path, cache, compact) for file_path in file_paths]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs if jobs > 0 else None) as executor:
+        return list(executor.map(Data.read_export, file_paths, itertools.repeat(cache), itertools.repeat(compact)))
+
+
+def read_batch(paths: list[str], options: Args.Options) -> Batch:
+    """Read and process stats of several users.
+
+    :param paths: Paths of WakaTime JSON files and directories containing them.
+    :param options: Options for processing the stats.
+    :return: Stats of the team and all stats of each user.
+    """
+    batch = Batch()
+    file_paths = find_export_files(paths)
+    batch.user_names = get_user_names(file_paths)
+    batch.exports = read_exports(file_paths, options.cache, options.jobs, options.compact)
+    batch.merged = Data.merge_exports(batch.exports)
+    batch.team = Data.analyze(batch.merged, options)
+    return batch
+
+
+def user_total_hours(batch: Batch, type_: Data.StatsType) -> np.ndarray:
+    """Get total hours of each user for the labels of the team.
+
+    Labels that are grouped under the label Other in the team stats are added to Other for each user too.
+
+    :param batch: Stats of the team and of each user.
+    :param type_: Type of the stats.
+    :return: Total hours with one row per label of the team stats and one column per user.
+    """
+    options = batch.team.options
+    team_stats = batch.team.stats[type_]
+    other_index = team_stats.label_indices.get("Other")
+    total_hours = np.zeros((len(team_stats.labels), len(batch.exports)))
+
+    for column, export in enumerate(batch.exports):
+        source = export.stats[type_]
+        start_index, end_index = Data.date_range_indices(export.dates, options.start_date, options.end_date)
+
+        # Only one range is needed from each user, so the cumulative hours are not worth calculating
+        for label, hours in zip(source.labels, source.hours[:, start_index:end_index].sum(axis=1, dtype=np.float64)):
+            row = team_stats.label_indices.get(label, other_index)
+            if hours != 0.0 and row is not None and Data.is_label_included(label, options):
+                total_hours[row, column] += hours
+
+    return total_hours
+
+
+def format_team_totals(batch: Batch, type_: Data.StatsType) -> str:
+    """Format total hours of each label for each user and for the team as a table.
+
+    :param batch: Stats of the team and of each user.
+    :param type_: Type of the stats.
+    :return: Table with a row for each label and a column for each user and for the team.
+    """
+    team_stats = batch.team.stats[type_]
+    hours = np.column_stack((user_total_hours(batch, type_), team_stats.total_hours()))
+    names = batch.user_names + ["Team"]
+
+    label_width = max([len(label) for label in team_stats.labels] + [10])
+    widths = [max(len(name), 8) for name in names]
+    lines = ["{0} by user (h)".format(type_.name.replace("_", " ").capitalize()),
+             " ".join(["Label".ljust(label_width)] + [name.rjust(width) for name, width in zip(names, widths)])]
+    for row, label in enumerate(team_stats.labels):
+        lines.append(" ".join([label.ljust(label_width)] + ["{0:.2f}".format(hours[row, column]).rjust(width)
+                                                            for column, width in enumerate(widths)]))
+
+    return "\n".join(lines)
@@ -0,0 +1,289 @@
+import argparse
+import datetime
+import gc
+import json
+import os.path
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import Args
+import Data
+import Plotting
+import Profiling
+
+
+project_directory: str = os.path.dirname(__file__)
+baseline_file_path: str = os.path.join(project_directory, "Benchmarks/baseline.json")
+
+# Stage is reported as a regression if it takes this many times longer than in the baseline and at least this many
+# seconds longer, so that the noise in the fastest stages is not reported
+regression_ratio: float = 1.25
+regression_minimum_time: float = 0.005
+
+# Commands that do not read any file may take this many seconds longer than starting the interpreter, so that
+# importing NumPy, Plotly or PySimpleGUI on startup is reported
+startup_budget: float = 0.1
+startup_repeat: int = 10
+startup_arguments: dict[str, list[str]] = {"help": ["-h"],
+                                           "invalid arguments": ["--max-points", "1", "stats.json"]}
+
+# Memory that the processed stats may keep in addition to their dates and hours, such as labels and the caches of Plotly
+memory_allowance: int = 128 * 1024
+
+
+def is_regression(time_: float, baseline_time: float) -> bool:
+    """Check whether a stage got slower than in the baseline.
+
+    :param time_: Time of the stage in seconds.
+    :param baseline_time: Time of the stage in the baseline in seconds.
+    :return: True if the stage got clearly slower, False otherwise.
+    """
+    return time_ > baseline_time * regression_ratio and time_ - baseline_time > regression_minimum_time
+
+
+def expected_bytes_per_day(analysis: Data.Analysis, compact: bool) -> int:
+    """Calculate the memory each day should need: one date and one value of each label of each type.
+
+    :param analysis: Processed stats.
+    :param compact: Whether the hours should be stored as 32-bit floats.
+    :return: Bytes per day.
+    """
+    label_count = sum(len(stats.labels) for stats in analysis.stats.values())
+    return np.dtype(np.int64).itemsize + label_count * np.dtype(Data.hours_type(compact)).itemsize
+
+
+def measure_retained_memory(file_path: str, options: Args.Options) -> tuple[int, int]:
+    """Measure the memory that the processed stats keep after the charts have been created.
+
+    Everything the charts add to the stats, such as cumulative hours, is included. The charts themselves are freed.
+
+    :param file_path: WakaTime JSON file path.
+    :param options: Options for processing the stats.
+    :return: Memory in bytes and the budget it should fit in.
+    """
+    tracemalloc.start()
+    try:
+        analysis = Data.read_stats(file_path, options)
+        Plotting.create_charts(analysis)
+        gc.collect()
+        memory = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    return memory, len(analysis.date_ordinals) * expected_bytes_per_day(analysis, options.compact) + memory_allowance
+
+
+def measure_startup() -> dict[str, float]:
+    """Measure how long WakaFree takes to print help and to report invalid arguments, each in a new process.
+
+    :return: Fastest time in seconds on top of the time it takes to start the interpreter, for each command.
+    """
+    def fastest_run(arguments: list[str]) -> float:
+        times = []
+        for _ in range(startup_repeat):
+            start_time = time.perf_counter()
+            subprocess.run([sys.executable] + arguments, cwd=project_directory, capture_output=True)
+            times.append(time.perf_counter() - start_time)
+        return min(times)
+
+    interpreter_time = fastest_run(["-c", "pass"])
+    return {name: fastest_run(["WakaFree.py"] + arguments) - interpreter_time
+            for name, arguments in startup_arguments.items()}
+
+
+def generate_export(file_path: str, years: int, labels_per_type: int, entries_per_day: int, seed: int = 0) -> None:
+    """Write a file with the same structure as the daily totals exported from WakaTime.
+
+    The same arguments always produce the same file. Some labels are used a lot more than others, like in real stats.
+
+    :param file_path: Path of the file to write.
+    :param years: Number of years of days.
+    :param labels_per_type: Number of different labels for each type of stats.
+    :param entries_per_day: Number of labels used on each day for each type of stats.
+    :param seed: Seed for the random numbers.
+    """
+    generator = random.Random(seed)
+    entries_per_day = min(entries_per_day, labels_per_type)
+    first_date = datetime.date(2000, 1, 1)
+    day_count = (datetime.date(first_date.year + years, 1, 1) - first_date).days
+
+    with open(file_path, "w") as file:
+        file.write('{"user": {"username": "benchmark"}, "range": {"start": "' + str(first_date) + '"}, "days": [')
+
+        for day_index in range(day_count):
+            day = {"date": str(first_date + datetime.timedelta(days=day_index))}
+            total_seconds = 0.0
+
+            for type_ in Data.stats_types_by_letter.values():
+                name = type_.name.replace("_", " ").capitalize()[:-1]
+                stats_of_the_day = []
+                for rank in sorted(generator.sample(range(labels_per_type), entries_per_day)):
+                    seconds = round(generator.expovariate(1.0) * 7200.0 / (rank + 1), 6)
+                    total_seconds += seconds
+                    stats_of_the_day.append({"name": "{0} {1}".format(name, rank + 1),
+                                             "total_seconds": seconds,
+                                             "digital": "{0}:{1:02d}".format(int(seconds // 3600),
+                                                                              int(seconds % 3600 // 60)),
+                                             "hours": int(seconds // 3600),
+                                             "minutes": int(seconds % 3600 // 60),
+                                             "text": "{0} hrs {1} mins".format(int(seconds // 3600),
+                                                                               int(seconds % 3600 // 60))})
+                day[type_.name.lower()] = stats_of_the_day
+
+            day["grand_total"] = {"total_seconds": total_seconds}
+
+            file.write((", " if day_index > 0 else "") + json.dumps(day))
+
+        file.write("]}")
+
+
+def run_pipeline(file_path: str, options: Args.Options, trace_memory: bool = False) -> dict[str, dict[str, float]]:
+    """Run the stages from reading the file to creating figures, without showing the figures.
+
+    The stages are measured with the same profiling that --profile uses, so the code that is measured is the code that
+    runs when the program is used.
+
+    :param file_path: WakaTime JSON file path.
+    :param options: Options for processing the stats.
+    :param trace_memory: Whether to trace peak memory. Tracing slows everything down.
+    :return: Total time in seconds and, if traced, the largest peak memory in bytes for each stage.
+    """
+    Profiling.reset()
+    Profiling.enable(trace_memory)
+    try:
+        # Same steps as in Args.execute_command and Plotting.plot
+        analysis = Data.read_stats(file_path, options)
+
+        # Converting to JSON is the part of showing a figure that does not depend on the browser
+        for chart in Plotting.create_charts(analysis):
+            with Profiling.Stage("to_json"):
+                chart.figure.to_json()
+    finally:
+        Profiling.disable()
+
+    return {stage: {"time": result.time, "peak_memory": result.peak_memory}
+            for stage, result in Profiling.results.items()}
+
+
+def measure(file_path: str, options: Args.Options, repeat: int) -> dict[str, dict[str, float]]:
+    """Measure wall time and peak memory of each stage.
+
+    :param file_path: WakaTime JSON file path.
+    :param options: Options for processing the stats.
+    :param repeat: Number of runs to take the fastest time from.
+    :return: Time in seconds and peak memory in bytes for each stage.
+    """
+    runs = [run_pipeline(file_path, options) for _ in range(repeat)]
+
+    # Memory is traced in a separate run because tracing slows everything down
+    results = run_pipeline(file_path, options, trace_memory=True)
+
+    for stage, stage_results in results.items():
+        stage_results["time"] = min(run[stage]["time"] for run in runs)
+
+    return results
+
+
+def format_results(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]]) -> str:
+    """Format results as a table and compare them to the baseline.
+
+    :param results: Time and peak memory for each stage.
+    :param baseline: Time and peak memory for each stage in the baseline. Empty if there is no baseline.
+    :return: Table with a row for each stage.
+    """
+    lines = ["{0:<18} {1:>10} {2:>10} {3:>7} {4:>10} {5:>10}".format("Stage", "Time (ms)", "Baseline", "Ratio",
+                                                                      "Peak (MB)", "Baseline")]
+    for stage, stage_results in results.items():
+        baseline_results = baseline.get(stage, {})
+        baseline_time = baseline_results.get("time", float("nan"))
+        ratio = stage_results["time"] / baseline_time if baseline_time > 0.0 else float("nan")
+        lines.append("{0:<18} {1:>10.1f} {2:>10.1f} {3:>7.2f} {4:>10.2f} {5:>10.2f}{6}".format(
+            stage, stage_results["time"] * 1000, baseline_time * 1000, ratio,
+            stage_results["peak_memory"] / 1024 ** 2, baseline_results.get("peak_memory", float("nan")) / 1024 ** 2,
+            "  REGRESSION" if is_regression(stage_results["time"], baseline_time) else ""))
+
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the time and memory used by each stage of WakaFree.")
+    parser.add_argument("--years", type=int, default=3, help="years of days in the generated file")
+    parser.add_argument("--labels", type=int, default=30, help="different labels for each type of stats")
+    parser.add_argument("--entries", type=int, default=8, help="labels used on each day for each type of stats")
+    parser.add_argument("--seed", type=int, default=0, help="seed for generating the file")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs to take the fastest time from")
+    parser.add_argument("-m", "--minimum-labeling-percentage", type=float, default=1.0,
+                        help="minimum labeling percentage used when grouping stats")
+    parser.add_argument("--compact", action="store_true", help="measure compact mode")
+    parser.add_argument("--generate", metavar="FILE", help="only write the generated file to FILE")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args()
+
+    # Only generate a file
+    if args.generate:
+        generate_export(args.generate, args.years, args.labels, args.entries, args.seed)
+        return
+
+    # Same options as when running python WakaFree.py -g leo -t leo -m MINIMUM_LABELING_PERCENTAGE --no-cache FILE
+    options = Args.Options(graphs="leo", totals="leo", minimum_labeling_percentage=args.minimum_labeling_percentage,
+                           cache=False, compact=args.compact)
+
+    scenario = "years={0} labels={1} entries={2} seed={3} m={4}".format(args.years, args.labels, args.entries,
+                                                                         args.seed, args.minimum_labeling_percentage)
+    if args.compact:
+        scenario += " compact"
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "stats.json")
+        generate_export(file_path, args.years, args.labels, args.entries, args.seed)
+        print("{0}: {1:.1f} MB".format(scenario, os.path.getsize(file_path) / 1024 ** 2))
+        results = measure(file_path, options, args.repeat)
+
+        # Measured after the other runs so that modules imported on the first run are not counted
+        memory, memory_budget = measure_retained_memory(file_path, options)
+
+    print("Memory kept by the stats: {0:.2f} MB (budget {1:.2f} MB)".format(memory / 1024 ** 2,
+                                                                            memory_budget / 1024 ** 2))
+
+    startup_times = measure_startup()
+    for name, startup_time in startup_times.items():
+        print("Startup with {0}: {1:.0f} ms (budget {2:.0f} ms)".format(name, startup_time * 1000,
+                                                                        startup_budget * 1000))
+
+    try:
+        with open(baseline_file_path, "r") as baseline_file:
+            baselines = json.load(baseline_file)
+    except OSError:
+        baselines = {}
+
+    baseline = baselines.get(scenario, {})
+    print(format_results(results, baseline))
+
+    if args.save_baseline:
+        baselines[scenario] = results
+        os.makedirs(os.path.dirname(baseline_file_path), exist_ok=True)
+        with open(baseline_file_path, "w") as baseline_file:
+            json.dump(baselines, baseline_file, indent=2)
+
+    # Fail if any stage got slower
+    elif any(is_regression(stage_results["time"], baseline[stage]["time"])
+             for stage, stage_results in results.items() if stage in baseline):
+        raise SystemExit(1)
+
+    # Fail if the stats keep more memory than their dates and hours need
+    if memory > memory_budget:
+        raise SystemExit(1)
+
+    # Fail if printing help or reporting invalid arguments imports more than it needs
+    if any(startup_time > startup_budget for startup_time in startup_times.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+
+# Bump this when the layout of cache entries changes so that old entries are not read
+cache_format_version: int = 3
+
+cache_directory: str = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+                                    "WakaFree")
+index_file_name: str = "index.json"
+maximum_cache_size: int = 512 * 1024 ** 2
+
+
+def file_digest(file_path: str) -> str:
+    """Calculate a hash of the contents of a file.
+
+    :param file_path: File path.
+    :return: Hexadecimal hash.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 ** 2), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_index() -> dict:
+    """Read the index which maps file paths to the hashes of their contents.
+
+    :return: Index. Keys are absolute file paths, values contain size, modification time and hash of the file.
+    """
+    try:
+        with open(os.path.join(cache_directory, index_file_name), "r") as index_file:
+            return json.load(index_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_index(index: dict) -> None:
+    """Write the index atomically.
+
+    :param index: Index. Keys are absolute file paths, values contain size, modification time and hash of the file.
+    """
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=cache_directory, suffix=".tmp")
+    with os.fdopen(file_descriptor, "w") as index_file:
+        json.dump(index, index_file)
+    os.replace(temporary_path, os.path.join(cache_directory, index_file_name))
+
+
+def entry_path(file_path: str) -> str:
+    """Get the path of the cache entry for a file.
+
+    The file is hashed only if its size or modification time differs from the ones in the index.
+
+    :param file_path: Path of the file to cache.
+    :return: Path of the directory of the cache entry.
+    """
+    file_path = os.path.abspath(file_path)
+    status = os.stat(file_path)
+    key = {"size": status.st_size, "mtime": status.st_mtime_ns}
+
+    index = read_index()
+    entry = index.get(file_path, {})
+    if entry.get("size") != key["size"] or entry.get("mtime") != key["mtime"] or "digest" not in entry:
+        entry = dict(key, digest=file_digest(file_path))
+        index[file_path] = entry
+        os.makedirs(cache_directory, exist_ok=True)
+        write_index(index)
+
+    return os.path.join(cache_directory, "v{0}-{1}".format(cache_format_version, entry["digest"]))
+
+
+def load(file_path: str) -> tuple[np.ndarray, dict[str, tuple[list[str], np.ndarray]]] | None:
+    """Load cached stats of a file.
+
+    The arrays are memory-mapped, so only the parts that are used are read from the disk.
+
+    :param file_path: Path of the cached file.
+    :return: Dates and, for each type of stats, labels and hours. None if the file is not cached.
+    """
+    path = entry_path(file_path)
+
+    try:
+        with open(os.path.join(path, "labels.json"), "r") as labels_file:
+            labels = json.load(labels_file)
+        dates = np.load(os.path.join(path, "dates.npy"), mmap_mode="r")
+        stats = {name: (labels[name], np.load(os.path.join(path, name + ".npy"), mmap_mode="r")) for name in labels}
+    except (OSError, ValueError, KeyError):
+        return None
+
+    # Mark entry as recently used
+    os.utime(path)
+
+    return dates, stats
+
+
+def store(file_path: str, dates: np.ndarray, stats: dict[str, tuple[list[str], np.ndarray]]) -> None:
+    """Store stats of a file in the cache and evict old entries if the cache has grown too large.
+
+    :param file_path: Path of the file to cache.
+    :param dates: Dates.
+    :param stats: Labels and hours for each type of stats.
+    """
+    path = entry_path(file_path)
+
+    # Write entry to a temporary directory first so that partial entries are never read
+    os.makedirs(cache_directory, exist_ok=True)
+    temporary_path = tempfile.mkdtemp(dir=cache_directory, suffix=".tmp")
+    np.save(os.path.join(temporary_path, "dates.npy"), dates)
+    for name, (labels, hours) in stats.items():
+        np.save(os.path.join(temporary_path, name + ".npy"), hours)
+    with open(os.path.join(temporary_path, "labels.json"), "w") as labels_file:
+        json.dump({name: labels for name, (labels, hours) in stats.items()}, labels_file)
+
+    try:
+        os.rename(temporary_path, path)
+    except OSError:
+        # Another process stored the same entry already
+        shutil.rmtree(temporary_path, ignore_errors=True)
+
+    evict()
+
+
+def directory_size(path: str) -> int:
+    """Get the total size of the files in a directory.
+
+    :param path: Directory path.
+    :return: Size in bytes.
+    """
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def evict() -> None:
+    """Remove least recently used entries until the cache is smaller than the maximum size."""
+    entries = [entry for entry in os.scandir(cache_directory)
+               if entry.is_dir() and not entry.name.endswith(".tmp")]
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+
+    # The most recently used entry is always kept
+    cache_size = directory_size(entries[0].path) if len(entries) > 0 else 0
+    for entry in entries[1:]:
+        cache_size += directory_size(entry.path)
+        if cache_size > maximum_cache_size:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+    # Remove temporary directories left behind by interrupted runs
+    for entry in os.scandir(cache_directory):
+        if entry.is_dir() and entry.name.endswith(".tmp") and entry.stat().st_mtime < time.time() - 3600:
+            shutil.rmtree(entry.path, ignore_errors=True)
@@ -1,11 +1,18 @@
 import dataclasses
 import enum
 import datetime
-import json
+import fnmatch
+import functools
+import re
+import threading
+import typing
 
 import numpy as np
 
 import Args
+import Cache
+import Profiling
+import Reader
 
 
 class StatsType(enum.Enum):
@@ -20,16 +27,112 @@ class Stats:
     """Data class for storing statistics.
 
     :ivar type_: Type of the data. Languages, editors or operating systems.
-    :ivar daily_stats: Daily stats. Keys are names such as Python, values are lists containing daily hours.
+    :ivar labels: Names such as Python. Each label has its own row in hours.
+    :ivar label_indices: Row index of each label.
+    :ivar hours: Daily hours. Rows are labels and columns are dates. 64-bit floats, or 32-bit floats in compact mode.
+    :ivar cumulative: Cumulative hours calculated from hours, or None if not calculated yet.
     """
     type_: StatsType = StatsType.UNKNOWN
-    daily_stats: dict = dataclasses.field(default_factory=dict)
+    labels: list[str] = dataclasses.field(default_factory=list)
+    label_indices: dict[str, int] = dataclasses.field(default_factory=dict)
+    hours: np.ndarray = dataclasses.field(default_factory=lambda: np.zeros((0, 0)))
+    cumulative: np.ndarray | None = dataclasses.field(default=None, repr=False)
+
+    def add_label(self, label: str) -> None:
+        """Add a label if it is not already present.
+
+        :param label: Name such as Python.
+        """
+        if label not in self.label_indices:
+            self.label_indices[label] = len(self.labels)
+            self.labels.append(label)
+
+    def set_rows(self, labels: list[str], hours: np.ndarray) -> None:
+        """Replace labels and hours.
+
+        :param labels: Names such as Python.
+        :param hours: Daily hours with one row per label.
+        """
+        self.labels = labels
+        self.label_indices = {label: index for index, label in enumerate(labels)}
+        self.hours = hours
+        self.cumulative = None
+
+    def cumulative_hours(self) -> np.ndarray:
+        """Get cumulative hours of each label. Calculated once after the hours have been set.
+
+        :return: Cumulative hours with one row per label. Column i is the total of the first i dates, so the total of
+                 dates from index i to index j - 1 is the difference of columns j and i.
+        """
+        if self.cumulative is None:
+            # Added up with 64-bit floats even in compact mode so that long date ranges stay accurate
+            self.cumulative = np.zeros((self.hours.shape[0], self.hours.shape[1] + 1))
+            np.cumsum(self.hours, axis=1, dtype=np.float64, out=self.cumulative[:, 1:])
+        return self.cumulative
+
+    def total_hours(self, start_index: int = 0, end_index: int | None = None) -> np.ndarray:
+        """Get total hours of each label.
+
+        :param start_index: Index of the first date to include.
+        :param end_index: Index after the last date to include. None to include all dates from the start index.
+        :return: Total hours in the same order as labels.
+        """
+        # Totals of all dates do not need the cumulative hours of every date
+        if start_index == 0 and end_index is None and self.cumulative is None:
+            return self.hours.sum(axis=1, dtype=np.float64)
+
+        cumulative_hours = self.cumulative_hours()
+        end_index = cumulative_hours.shape[1] - 1 if end_index is None else end_index
+        return cumulative_hours[:, end_index] - cumulative_hours[:, start_index]
 
 
-dates: list[datetime.date] = []
-languages_stats: Stats = Stats(StatsType.LANGUAGES)
-editors_stats: Stats = Stats(StatsType.EDITORS)
-operating_systems_stats: Stats = Stats(StatsType.OPERATING_SYSTEMS)
+@dataclasses.dataclass
+class Export:
+    """Data class for storing all stats of a WakaTime JSON file.
+
+    :ivar dates: Dates as proleptic Gregorian ordinals.
+    :ivar stats: Stats of each type for all the dates, without filtering or grouping.
+    """
+    dates: np.ndarray = dataclasses.field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    stats: dict[StatsType, Stats] = dataclasses.field(default_factory=dict)
+
+
+@dataclasses.dataclass
+class Analysis:
+    """Data class for storing stats processed with some options.
+
+    :ivar options: Options used for processing the stats.
+    :ivar date_ordinals: Dates in the date range as proleptic Gregorian ordinals, in order.
+    :ivar stats: Filtered, grouped and sorted stats of each requested type.
+    """
+    options: Args.Options = dataclasses.field(default_factory=Args.Options)
+    date_ordinals: np.ndarray = dataclasses.field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    stats: dict[StatsType, Stats] = dataclasses.field(default_factory=dict)
+
+
+# Type of stats for each letter used in arguments. The key for the type in WakaTime JSON file is the lowercase name of
+# the type, so adding a type here is enough for it to be read along with the others.
+stats_types_by_letter: dict[str, StatsType] = {"l": StatsType.LANGUAGES,
+                                               "e": StatsType.EDITORS,
+                                               "o": StatsType.OPERATING_SYSTEMS}
+
+
+def hours_type(compact: bool) -> type:
+    """Get the type of the daily hours.
+
+    :param compact: Whether to use compact mode.
+    :return: 32-bit float in compact mode, 64-bit float otherwise.
+    """
+    return np.float32 if compact else np.float64
+
+
+def ordinals_to_datetime64(date_ordinals: np.ndarray) -> np.ndarray:
+    """Convert proleptic Gregorian ordinals to datetime64 without creating a date object for each date.
+
+    :param date_ordinals: Dates as proleptic Gregorian ordinals.
+    :return: Dates as datetime64 with a resolution of a day.
+    """
+    return (date_ordinals - datetime.date(1970, 1, 1).toordinal()).astype("datetime64[D]")
 
 
 def seconds_to_hours(seconds: float) -> float:
@@ -50,153 +153,482 @@ def string_to_date(date_string: str) -> datetime.date:
     return datetime.date(int(date_string[0:4]), int(date_string[5:7]), int(date_string[8:10]))
 
 
-def fetch_keys(day: dict) -> None:
-    """Get keys for stats.
+class LabelFilter:
+    """Filter that decides which labels are read, based on ignored and searched labels.
 
-    :param day: Day from WakaTime JSON file.
+    Labels are given as exact names, as glob patterns such as Java* or as regular expressions starting with re:, such
+    as re:^(C|C\\+\\+)$. Exact names and glob patterns are combined into one compiled regular expression and each
+    regular expression is compiled on its own. The decision for each label is stored so that each label is checked
+    only once.
+
+    :ivar ignored: Compiled ignored labels. Empty if no labels are ignored.
+    :ivar searched: Compiled searched labels. Empty if all labels that are not ignored are read.
+    :ivar decisions: Decision for each label checked so far.
+    :ivar decisions_lock: Lock for storing decisions from several threads.
     """
 
-    # Languages
-    for language in day["languages"]:
-        if "l" not in (Args.graphs + Args.totals).lower():
-            break
-        if len(Args.searched_stats) == 0:
-            if language["name"] in Args.ignored_stats:
-                continue
-            languages_stats.daily_stats.setdefault(language["name"], [])
-        else:
-            if language["name"] not in Args.searched_stats:
-                continue
-            languages_stats.daily_stats.setdefault(language["name"], [])
-
-    # Editors
-    for editor in day["editors"]:
-        if "e" not in (Args.graphs + Args.totals).lower():
-            break
-        if len(Args.searched_stats) == 0:
-            if editor["name"] in Args.ignored_stats:
-                continue
-            editors_stats.daily_stats.setdefault(editor["name"], [])
-        else:
-            if editor["name"] not in Args.searched_stats:
-                continue
-            editors_stats.daily_stats.setdefault(editor["name"], [])
-
-    # Operating systems
-    for operating_system in day["operating_systems"]:
-        if "o" not in (Args.graphs + Args.totals).lower():
-            break
-        if len(Args.searched_stats) == 0:
-            if operating_system["name"] in Args.ignored_stats:
-                continue
-            operating_systems_stats.daily_stats.setdefault(operating_system["name"], [])
+    def __init__(self, ignored_stats: tuple[str, ...], searched_stats: tuple[str, ...],
+                 case_insensitive: bool = False) -> None:
+        """Compile the labels.
+
+        :param ignored_stats: Ignored labels or patterns.
+        :param searched_stats: Searched labels or patterns.
+        :param case_insensitive: Whether to ignore the case of the letters.
+        """
+        flags = re.IGNORECASE if case_insensitive else 0
+        self.ignored = compile_patterns(ignored_stats, flags)
+        self.searched = compile_patterns(searched_stats, flags)
+        self.decisions: dict[str, bool] = {}
+        self.decisions_lock = threading.Lock()
+
+    def includes(self, label: str) -> bool:
+        """Check whether stats with the given label should be read.
+
+        :param label: Name such as Python.
+        :return: False if the label is ignored or not searched for, True otherwise.
+        """
+        decision = self.decisions.get(label)
+        if decision is None:
+            if len(self.searched) == 0:
+                decision = not any(pattern.search(label) is not None for pattern in self.ignored)
+            else:
+                decision = any(pattern.search(label) is not None for pattern in self.searched)
+            with self.decisions_lock:
+                self.decisions[label] = decision
+        return decision
+
+
+def compile_patterns(patterns: tuple[str, ...], flags: int) -> list[re.Pattern]:
+    """Compile labels and patterns into regular expressions.
+
+    :param patterns: Exact labels, glob patterns with *, ? or [, and regular expressions starting with re:.
+    :param flags: Flags of the regular expressions.
+    :return: Compiled regular expressions. A label matches any of the patterns if any of the expressions finds a match
+             in it. Empty if there are no patterns.
+    :raises ValueError: If a regular expression is invalid.
+    """
+    compiled = []
+    expressions = []
+    for pattern in patterns:
+        if pattern.startswith("re:"):
+            # Each regular expression is compiled alone so that its inline flags apply only to itself
+            try:
+                compiled.append(re.compile(pattern[3:], flags))
+            except re.error as error:
+                raise ValueError("Invalid pattern {0}: {1}".format(pattern, error))
+        elif any(character in pattern for character in "*?["):
+            expressions.append(r"\A" + fnmatch.translate(pattern))
         else:
-            if operating_system["name"] not in Args.searched_stats:
-                continue
-            operating_systems_stats.daily_stats.setdefault(operating_system["name"], [])
+            expressions.append(r"\A" + re.escape(pattern) + r"\Z")
+
+    # Exact labels and glob patterns are always valid, so they can be searched for with one expression
+    if len(expressions) > 0:
+        compiled.insert(0, re.compile("|".join("(?:{0})".format(expression) for expression in expressions), flags))
+
+    return compiled
+
+
+@functools.lru_cache(maxsize=64)
+def get_label_filter(ignored_stats: tuple[str, ...], searched_stats: tuple[str, ...],
+                     case_insensitive: bool) -> LabelFilter:
+    """Get the filter for some ignored and searched labels, compiling it only once.
+
+    :param ignored_stats: Ignored labels or patterns.
+    :param searched_stats: Searched labels or patterns.
+    :param case_insensitive: Whether to ignore the case of the letters.
+    :return: Label filter.
+    """
+    return LabelFilter(ignored_stats, searched_stats, case_insensitive)
+
+
+def is_label_included(label: str, options: Args.Options) -> bool:
+    """Check whether stats with the given label should be read.
+
+    :param label: Name such as Python.
+    :param options: Options with ignored and searched labels.
+    :return: False if the label is ignored or not searched for, True otherwise.
+    """
+    return get_label_filter(tuple(options.ignored_stats), tuple(options.searched_stats),
+                            options.case_insensitive).includes(label)
 
 
-def populate_stats(stats_source: dict, stats_destination: Stats) -> None:
-    """Read daily stats.
+@Profiling.Stage("parse")
+def populate_stats(days: typing.Iterable[dict], export: Export, compact: bool = False) -> None:
+    """Read dates and daily stats of all types in one pass.
 
-    :param stats_source: Data read from WakaTime JSON file.
-    :param stats_destination: Object to store stats in.
+    :param days: Days from WakaTime JSON file.
+    :param export: Object to store dates and stats in.
+    :param compact: Whether to store the hours as 32-bit floats.
     """
+    dates_read = []
+
+    # Label rows, date columns and seconds of the read stats for each type
+    entries = {type_: ([], [], []) for type_ in export.stats.keys()}
 
     # Loop through all days
-    for day in stats_source["days"]:
-        # Skip day depending on start and end dates
-        if day["date"] < str(Args.start_date):
-            continue
-        elif day["date"] > str(Args.end_date):
-            continue
+    for day in days:
+        date_index = len(dates_read)
+        dates_read.append(string_to_date(day["date"]).toordinal())
+
+        # Collect stats of the day for each type
+        for stats in export.stats.values():
+            label_indices, date_indices, seconds = entries[stats.type_]
+
+            for stat in day[stats.type_.name.lower()]:
+                label_index = stats.label_indices.get(stat["name"])
+                if label_index is None:
+                    stats.add_label(stat["name"])
+                    label_index = stats.label_indices[stat["name"]]
+
+                label_indices.append(label_index)
+                date_indices.append(date_index)
+                seconds.append(stat["total_seconds"])
+
+    # Dates are looked up with binary search, so they have to be in order
+    export.dates = np.array(dates_read, dtype=np.int64)
+    order = np.argsort(export.dates, kind="stable")
+    export.dates = export.dates[order]
+
+    # Write collected stats to their places
+    for stats in export.stats.values():
+        label_indices, date_indices, seconds = entries[stats.type_]
+        hours = np.zeros((len(stats.labels), len(dates_read)), dtype=hours_type(compact))
+        hours[label_indices, date_indices] = seconds_to_hours(np.array(seconds, dtype=float))
+        stats.set_rows(stats.labels, hours[:, order])
+
+
+def parse_days(days: typing.Iterable[dict], compact: bool = False) -> Export:
+    """Read dates and daily stats of all types from days.
+
+    :param days: Days from WakaTime JSON file.
+    :param compact: Whether to store the hours as 32-bit floats.
+    :return: Dates and stats of all types.
+    """
+    export = Export(stats={type_: Stats(type_) for type_ in stats_types_by_letter.values()})
+    populate_stats(days, export, compact)
+    return export
+
+
+@Profiling.Stage("merge_exports")
+def merge_exports(exports: list[Export]) -> Export:
+    """Add stats of several exports together.
+
+    :param exports: Dates and stats of all types for each file.
+    :return: Dates of all exports and, for each type, labels of all exports with their hours added together.
+    """
+    merged = Export(dates=np.unique(np.concatenate([np.zeros(0, dtype=np.int64)]
+                                                   + [export.dates for export in exports])))
+
+    for type_ in stats_types_by_letter.values():
+        stats = Stats(type_)
+        for export in exports:
+            for label in export.stats[type_].labels:
+                stats.add_label(label)
+
+        # Add the label by date matrix of each export to its rows and columns in the merged matrix
+        hours = np.zeros((len(stats.labels), len(merged.dates)),
+                         dtype=np.result_type(np.float32, *[export.stats[type_].hours for export in exports]))
+        for export in exports:
+            source = export.stats[type_]
+            rows = np.array([stats.label_indices[label] for label in source.labels], dtype=np.intp)
+            columns = np.searchsorted(merged.dates, export.dates)
+            hours[np.ix_(rows, columns)] += source.hours
 
-        # Loop labels and append stats
-        for label in stats_destination.daily_stats.keys():
-            # Stats for the type
-            stats_of_the_day = day[stats_destination.type_.name.lower()]
+        stats.set_rows(stats.labels, hours)
+        merged.stats[type_] = stats
 
-            # Add stats for label to current date
-            stats_destination.daily_stats[label].append(seconds_to_hours(
-                next((stat["total_seconds"] for stat in stats_of_the_day if stat["name"] == label), 0.0)
-            ))
+    return merged
 
 
-def unify_stats(stats: Stats, minimum_labeling_percentage: float) -> None:
+@Profiling.Stage("read_export")
+def read_export(file_path: str, cache: bool = True, compact: bool = False) -> Export:
+    """Read all stats from a WakaTime JSON file, or from the cache if the file has been read before.
+
+    :param file_path: WakaTime JSON file path.
+    :param cache: Whether to read and write cached stats.
+    :param compact: Whether to store the hours as 32-bit floats.
+    :return: Dates and stats of all types.
+    """
+    export = Export(stats={type_: Stats(type_) for type_ in stats_types_by_letter.values()})
+
+    # Use cached stats if available
+    with Profiling.Stage("load_cache"):
+        try:
+            cached = Cache.load(file_path) if cache else None
+        except OSError:
+            # Cache directory cannot be created or written, so the file is parsed as if nothing was cached
+            cached = None
+    if cached is not None and all(type_.name.lower() in cached[1] for type_ in export.stats.keys()):
+        export.dates = cached[0]
+        for type_, stats in export.stats.items():
+            labels, hours = cached[1][type_.name.lower()]
+            stats.set_rows(labels, hours.astype(hours_type(compact), copy=False))
+        return export
+
+    # Cached stats are always 64-bit so that the same entry can be used in every mode
+    export = parse_days(Reader.read_days(file_path), compact and not cache)
+
+    if cache:
+        with Profiling.Stage("store_cache"):
+            try:
+                Cache.store(file_path, export.dates,
+                            {type_.name.lower(): (stats.labels, stats.hours) for type_, stats in export.stats.items()})
+            except OSError:
+                # Stats are still usable without storing them
+                pass
+        if compact:
+            for stats in export.stats.values():
+                stats.set_rows(stats.labels, stats.hours.astype(np.float32))
+
+    return export
+
+
+@Profiling.Stage("select_stats")
+def select_stats(stats_source: Stats, date_indices: np.ndarray, options: Args.Options) -> Stats:
+    """Copy stats of included labels for the given dates.
+
+    :param stats_source: Stats of all labels for all dates.
+    :param date_indices: Indices of the dates to copy.
+    :param options: Options with ignored and searched labels.
+    :return: Copied stats.
+    """
+    label_indices = np.array([index for index, label in enumerate(stats_source.labels)
+                              if is_label_included(label, options)], dtype=np.intp)
+    hours = np.array(stats_source.hours[np.ix_(label_indices, date_indices)])
+
+    # Leave out labels without any time in the date range
+    used = hours.any(axis=1)
+    stats = Stats(stats_source.type_)
+    stats.set_rows([stats_source.labels[index] for index in label_indices[used]], hours[used])
+    return stats
+
+
+def find_grouped_labels(labels: list[str], total_hours: np.ndarray, minimum_labeling_percentage: float,
+                        top_labels: int = 0) -> np.ndarray:
+    """Find the labels to group under the label Other.
+
+    :param labels: Labels of the stats.
+    :param total_hours: Total hours of each label.
+    :param minimum_labeling_percentage: Labels with less than this percentage of the total time are grouped.
+    :param top_labels: Labels other than the given number of labels with the most time are grouped, or 0 for no limit.
+    :return: Whether to group each label. An existing label Other is never grouped.
+    """
+    grouped = np.zeros(len(labels), dtype=bool)
+    other_index = labels.index("Other") if "Other" in labels else None
+
+    # Labels with low percentage
+    grand_total_hours = total_hours.sum()
+    if minimum_labeling_percentage > 0.0 and grand_total_hours > 0.0:
+        grouped |= total_hours / grand_total_hours * 100.0 < minimum_labeling_percentage
+
+    # Labels other than the ones with the most time, found without sorting all the labels
+    if 0 < top_labels < len(labels):
+        ranked_hours = np.array(total_hours, dtype=np.float64)
+        if other_index is not None:
+            ranked_hours[other_index] = -np.inf
+        grouped[np.argpartition(-ranked_hours, top_labels - 1)[top_labels:]] = True
+
+    if other_index is not None:
+        grouped[other_index] = False
+    return grouped
+
+
+@Profiling.Stage("unify_stats")
+def unify_stats(stats: Stats, minimum_labeling_percentage: float, top_labels: int = 0) -> None:
     """Group stats under the label Other.
 
     :param stats: Object containing stats.
     :param minimum_labeling_percentage: Anything less than this percentage will be moved under the label Other.
+    :param top_labels: Anything but this many labels with the most time will be moved under the label Other, or 0 for
+                       no limit.
     """
-    if Args.minimum_labeling_percentage == 0.0:
+    if minimum_labeling_percentage == 0.0 and top_labels <= 0:
         return
 
-    grand_total_time = sum([sum(hours) for hours in stats.daily_stats.values()])
-    removed_labels = []
+    removed = find_grouped_labels(stats.labels, stats.total_hours(), minimum_labeling_percentage, top_labels)
 
-    # Add label other if not already present
-    stats.daily_stats.setdefault("Other", [0.0 for date in dates])
+    # Nothing to move under the label Other
+    if not removed.any():
+        return
 
     # Move stats with low percentage under the label Other
-    for key in stats.daily_stats.keys():
-        if key == "Other":
-            continue
-
-        total_time = sum(stats.daily_stats[key])
-        if total_time / grand_total_time * 100.0 < minimum_labeling_percentage:
-            stats.daily_stats["Other"] = np.add(stats.daily_stats["Other"], stats.daily_stats[key]).tolist()
-            removed_labels.append(key)
-
-    # Remove the label Other if it is not used
-    if len(removed_labels) == 0:
-        del(stats.daily_stats["Other"])
-        return
+    other_hours = stats.hours[removed].sum(axis=0)
+    kept = ~removed
+    labels = [label for label, keep in zip(stats.labels, kept) if keep]
+    hours = stats.hours[kept]
+    if "Other" not in labels:
+        labels.append("Other")
+        hours = np.vstack((hours, other_hours))
+    else:
+        hours[labels.index("Other")] += other_hours
 
-    # Remove duplicate stats of labels moved to Other
-    for label in removed_labels:
-        del(stats.daily_stats[label])
+    stats.set_rows(labels, hours)
 
 
+@Profiling.Stage("sort_stats")
 def sort_stats(stats: Stats) -> None:
     """Sort stats from most commonly used to least commonly used.
 
     :param stats: Object containing stats.
     """
-    stats.daily_stats = dict(sorted(stats.daily_stats.items(), key=lambda pair: sum(pair[1]), reverse=True))
+    order = np.argsort(-stats.total_hours(), kind="stable")
+    stats.set_rows([stats.labels[index] for index in order], stats.hours[order])
+
+
+def date_range_indices(date_ordinals: np.ndarray, start_date: datetime.date,
+                       end_date: datetime.date) -> tuple[int, int]:
+    """Find the dates in a range.
+
+    :param date_ordinals: Dates as proleptic Gregorian ordinals, in order.
+    :param start_date: First date of the range (inclusive).
+    :param end_date: Last date of the range (inclusive).
+    :return: Index of the first date in the range and index after the last date in the range.
+    """
+    return (int(np.searchsorted(date_ordinals, start_date.toordinal(), side="left")),
+            int(np.searchsorted(date_ordinals, end_date.toordinal(), side="right")))
+
+
+def period_boundaries(date_ordinals: np.ndarray, period: str) -> tuple[np.ndarray, np.ndarray]:
+    """Split dates into periods.
 
+    :param date_ordinals: Dates as proleptic Gregorian ordinals, in order.
+    :param period: Length of the periods: day, week, month or year.
+    :return: First day of each period as datetime64 and indices where the periods start followed by the number of dates.
+    """
+    days = ordinals_to_datetime64(date_ordinals)
+
+    match period:
+        case "day":
+            period_starts = days
+        case "week":
+            # Ordinal 1 is a Monday
+            period_starts = days - ((date_ordinals - 1) % 7).astype("timedelta64[D]")
+        case "month":
+            period_starts = days.astype("datetime64[M]").astype("datetime64[D]")
+        case "year":
+            period_starts = days.astype("datetime64[Y]").astype("datetime64[D]")
+        case _:
+            raise ValueError("Unknown period: {0}".format(period))
+
+    # Dates are in order, so each period starts where the period start changes
+    start_indices = np.flatnonzero(np.concatenate(([len(period_starts) > 0], period_starts[1:] != period_starts[:-1])))
+
+    return period_starts[start_indices], np.append(start_indices, len(date_ordinals))
+
+
+def period_total_hours(analysis: Analysis, stats: Stats, period: str) -> tuple[np.ndarray, np.ndarray]:
+    """Get total hours of each label in each period.
+
+    :param analysis: Processed stats.
+    :param stats: Object containing stats of the analysis.
+    :param period: Length of the periods: day, week, month or year.
+    :return: First day of each period as datetime64 and total hours with one row per label and one column per period.
+    """
+    period_starts, boundaries = period_boundaries(analysis.date_ordinals, period)
 
-def read_stats(file_path: str) -> None:
+    # Periods are not empty, so adding up the hours of each period in one pass does not need the cumulative hours
+    if stats.cumulative is None:
+        return period_starts, np.add.reduceat(stats.hours, boundaries[:-1], axis=1, dtype=np.float64)
+
+    cumulative_hours = stats.cumulative_hours()
+    return period_starts, cumulative_hours[:, boundaries[1:]] - cumulative_hours[:, boundaries[:-1]]
+
+
+def group_top_labels_per_period(labels: list[str], hours: np.ndarray,
+                                top_labels: int) -> tuple[list[str], np.ndarray]:
+    """Keep only the labels with the most time in each period and add the hours of the rest under the label Other.
+
+    :param labels: Labels of the stats.
+    :param hours: Hours with one row per label and one column per period.
+    :param top_labels: Number of labels to keep in each period, or 0 for no limit.
+    :return: Labels that are kept in at least one period, and their hours with zeros in the periods they are not kept
+             in. The label Other is last unless it was already in the labels.
+    """
+    if top_labels <= 0 or top_labels >= len(labels):
+        return labels, hours
+
+    other_index = labels.index("Other") if "Other" in labels else None
+    ranked_hours = -hours
+    if other_index is not None:
+        ranked_hours[other_index] = np.inf
+
+    # Labels with the most time in each period, found without sorting all the labels of each period
+    kept = np.zeros(hours.shape, dtype=bool)
+    kept[np.argpartition(ranked_hours, top_labels - 1, axis=0)[:top_labels], np.arange(hours.shape[1])] = True
+    if other_index is not None:
+        kept[other_index] = True
+    other_hours = np.where(kept, 0.0, hours).sum(axis=0)
+    hours = np.where(kept, hours, 0.0)
+
+    # Labels without time in any period they are kept in are left out
+    rows = hours.any(axis=1)
+    if other_index is not None:
+        rows[other_index] = True
+    labels = [label for label, row in zip(labels, rows) if row]
+    hours = hours[rows]
+
+    if other_index is not None:
+        hours[labels.index("Other")] += other_hours
+    elif other_hours.any():
+        labels.append("Other")
+        hours = np.vstack((hours, other_hours))
+
+    return labels, hours
+
+
+def format_breakdown(analysis: Analysis, stats: Stats, period: str) -> str:
+    """Format total hours of each label in each period as a table.
+
+    :param analysis: Processed stats.
+    :param stats: Object containing stats of the analysis.
+    :param period: Length of the periods: week, month or year.
+    :return: Table with a row for each period and a column for each label.
+    """
+    period_starts, hours = period_total_hours(analysis, stats, period)
+    period_names = np.datetime_as_string(period_starts, unit={"month": "M", "year": "Y"}.get(period, "D"))
+
+    widths = [max(len(label), 8) for label in stats.labels]
+    lines = ["{0} by {1} (h)".format(stats.type_.name.replace("_", " ").capitalize(), period),
+             " ".join(["Period".ljust(10)] + [label.rjust(width) for label, width in zip(stats.labels, widths)])]
+    for column, period_name in enumerate(period_names):
+        lines.append(" ".join([period_name.ljust(10)] + ["{0:.2f}".format(hours[row, column]).rjust(width)
+                                                         for row, width in enumerate(widths)]))
+
+    return "\n".join(lines)
+
+
+def analyze(export: Export, options: Args.Options) -> Analysis:
+    """Filter, group and sort stats.
+
+    The export is not modified, so it can be analyzed again with other options.
+
+    :param export: All stats read from a file.
+    :param options: Options for processing the stats.
+    :return: Processed stats of the types given in graphs and totals of the options.
+    """
+    analysis = Analysis(options)
+
+    # Dates in given range
+    date_indices = np.flatnonzero((export.dates >= options.start_date.toordinal())
+                                  & (export.dates <= options.end_date.toordinal()))
+    analysis.date_ordinals = np.array(export.dates[date_indices])
+
+    # Filter, group and sort data
+    for letter, type_ in stats_types_by_letter.items():
+        if letter in (options.graphs + options.totals).lower():
+            stats = select_stats(export.stats[type_], date_indices, options)
+            unify_stats(stats, options.minimum_labeling_percentage, options.top_labels)
+            sort_stats(stats)
+            analysis.stats[type_] = stats
+
+    return analysis
+
+
+def read_stats(file_path: str, options: Args.Options) -> Analysis:
     """Read and process stats.
 
     :param file_path: WakaTime JSON file path.
+    :param options: Options for processing the stats.
+    :return: Processed stats.
     """
-
-    # Open file
-    with open(file_path, "r") as file:
-        stats = json.load(file)
-
-        # Loop dates
-        for date in stats["days"]:
-            # Skip day if not in given range
-            if date["date"] < str(Args.start_date) or date["date"] > str(Args.end_date):
-                continue
-
-            # Add date to list
-            dates.append(string_to_date(date["date"]))
-
-            # Fetch keys for stats
-            fetch_keys(date)
-
-        # Read, group and sort data
-        if "l" in (Args.graphs + Args.totals):
-            populate_stats(stats, languages_stats)
-            unify_stats(languages_stats, Args.minimum_labeling_percentage)
-            sort_stats(languages_stats)
-        if "e" in (Args.graphs + Args.totals):
-            populate_stats(stats, editors_stats)
-            unify_stats(editors_stats, Args.minimum_labeling_percentage)
-            sort_stats(editors_stats)
-        if "o" in (Args.graphs + Args.totals):
-            populate_stats(stats, operating_systems_stats)
-            unify_stats(operating_systems_stats, Args.minimum_labeling_percentage)
-            sort_stats(operating_systems_stats)
+    return analyze(read_export(file_path, options.cache, options.compact), options)
@@ -1,13 +1,135 @@
 import ctypes
+import dataclasses
 import datetime
+import os
+import threading
+import time
 
 import PySimpleGUI as sg
 
 import Args
+import Data
 
 
-def show() -> None:
-    """Show GUI."""
+@dataclasses.dataclass
+class LoadedFile:
+    """Data class for storing the parsed stats of the file chosen last, so that it is not parsed again.
+
+    :ivar file_path: WakaTime JSON file path.
+    :ivar status: Size and modification time of the file when it was parsed.
+    :ivar export: Dates and stats of all types.
+    """
+    file_path: str = ""
+    status: tuple[int, int] = (0, 0)
+    export: Data.Export | None = None
+
+
+def read_options(values: dict, options: Args.Options) -> Args.Options:
+    """Get options from the values entered by the user.
+
+    :param values: Values of the input elements of the window.
+    :param options: Options given as arguments, used for the options that cannot be changed in the window.
+    :return: New options.
+    """
+    options = dataclasses.replace(options)
+
+    options.file_name = values["input_file"]
+
+    options.graphs = ""
+    options.graphs += "l" if values["input_graphs_l"] else ""
+    options.graphs += "e" if values["input_graphs_e"] else ""
+    options.graphs += "o" if values["input_graphs_o"] else ""
+
+    options.totals = ""
+    options.totals += "l" if values["input_totals_l"] else ""
+    options.totals += "e" if values["input_totals_e"] else ""
+    options.totals += "o" if values["input_totals_o"] else ""
+
+    options.ignored_stats = values["input_ignore"].split(",") if values["input_ignore"] != "" else []
+
+    options.searched_stats = values["input_search"].split(",") if values["input_search"] != "" else []
+
+    options.case_insensitive = values["input_case_insensitive"]
+
+    options.minimum_labeling_percentage = float(values["input_minimum_labeling_percentage"])
+
+    options.top_labels = int(values["input_top_labels"]) if values["input_top_labels"] != "" else 0
+    if options.top_labels < 0:
+        raise ValueError("top labels cannot be negative")
+
+    try:
+        options.start_date = datetime.date(int(values["input_start_date"][0:4]),
+                                           int(values["input_start_date"][5:7]),
+                                           int(values["input_start_date"][8:10]))
+    except ValueError:
+        options.start_date = datetime.date(1, 1, 1)
+
+    try:
+        options.end_date = datetime.date(int(values["input_end_date"][0:4]),
+                                         int(values["input_end_date"][5:7]),
+                                         int(values["input_end_date"][8:10]))
+    except ValueError:
+        options.end_date = datetime.date(9999, 12, 31)
+
+    options.breakdown = values["input_breakdown"]
+
+    return options
+
+
+def process(window: sg.Window, options: Args.Options, loaded_file: LoadedFile) -> None:
+    """Read, process and draw stats in a background thread, reporting progress to the window with events.
+
+    The file is parsed only if it is not the file parsed last or if it has changed since.
+
+    :param window: Window to send the events progress, output, done and error to.
+    :param options: Options entered by the user.
+    :param loaded_file: Parsed stats of the file chosen last, replaced if the file is parsed.
+    """
+    # Plotly is imported only when it is needed so that the window opens quickly
+    import Plotting
+
+    start_time = time.perf_counter()
+    try:
+        # Parse the file only if it has changed
+        status = os.stat(options.file_name)
+        status = (status.st_size, status.st_mtime_ns)
+        if loaded_file.file_path != options.file_name or loaded_file.status != status:
+            window.write_event_value("progress", (0, "Reading {0}...".format(options.file_name)))
+            loaded_file.export = Data.read_export(options.file_name, options.cache, options.compact)
+            loaded_file.file_path, loaded_file.status = options.file_name, status
+
+        window.write_event_value("progress", (1, "Processing stats..."))
+        analysis = Data.analyze(loaded_file.export, options)
+
+        # Print total times for each period
+        if options.breakdown != "":
+            window.write_event_value("output", "\n\n".join(Data.format_breakdown(analysis, stats, options.breakdown)
+                                                            for stats in analysis.stats.values()))
+
+        # Plot data
+        else:
+            window.write_event_value("progress", (2, "Drawing charts..."))
+            Plotting.plot(analysis)
+    except (OSError, ValueError) as error:
+        window.write_event_value("error", str(error))
+        return
+
+    # Rendering images can fail in many ways, and the window has to be told about all of them or it keeps waiting
+    except Exception as error:
+        window.write_event_value("error", "{0}: {1}".format(type(error).__name__, error))
+        return
+
+    window.write_event_value("done", time.perf_counter() - start_time)
+
+
+def show(options: Args.Options) -> None:
+    """Show GUI and process the stats whenever the user presses OK, until the window is closed.
+
+    The window stays responsive while the stats are processed, and the parsed file is kept in memory so that the stats
+    can be shown again quickly with other settings.
+
+    :param options: Options given as arguments. The values entered by the user replace them.
+    """
     try:
         ctypes.windll.shcore.SetProcessDpiAwareness(True)
     except AttributeError:
@@ -16,22 +138,30 @@ def show() -> None:
     help_file = "The file that contains your statistics."
     help_graphs = "Daily statistics."
     help_totals = "Total times."
-    help_ignore = "Ignored stats. Labels separated by commas and nothing more."
+    help_ignore = ("Ignored stats. Labels separated by commas and nothing more.\n"
+                   "Glob patterns such as Java* and regular expressions starting with re: can be used too.")
     help_search = ("Stats to search for. Labels separated by commas and nothing more.\n"
+                   "Glob patterns such as Java* and regular expressions starting with re: can be used too.\n"
                    "If nothing is entered then all the stats in the given file will be read.")
+    help_case_insensitive = "Ignore the case of the letters in ignored and searched stats."
     help_minimum_labeling_percentage = ("Inclusive lover limit for labeling the stats.\n"
                                         "Everything under this percentage will be moved to the group Other.")
+    help_top_labels = ("Number of labels with the most time to keep.\n"
+                       "The rest will be moved to the group Other. If 0 then the number of labels is not limited.")
     help_start_date = ("Start date in format YYYY-MM-DD. Inclusive.\n"
                        "If no date is entered then the stats will be drawn from the very beginning.")
     help_end_date = ("End date in format YYYY-MM-DD. Inclusive.\n"
                      "If no date is entered then the stats will be drawn to the very end.")
+    help_breakdown = ("Show total times for each week, month or year below instead of drawing.\n"
+                      "If nothing is selected then the stats will be drawn.")
 
     # Window layout
     layout_row_0 = [sg.Text("Hover over a variable name to get help.")]
     layout_row_1 = [sg.HorizontalSeparator()]
     layout_row_2 = [sg.Text("File*", tooltip=help_file),
                     sg.InputText(key="input_file"),
-                    sg.FileBrowse(file_types=(("JSON Files", "*.json"),))]
+                    sg.FileBrowse(file_types=(("JSON Files", "*.json *.jsonl *.gz *.bz2 *.xz *.zip"),
+                                              ("All Files", "*.*")))]
     layout_row_3 = [sg.Text("Graphs", tooltip=help_graphs),
                     sg.Checkbox("Languages", default=True, key="input_graphs_l"),
                     sg.Checkbox("Editors", default=True, key="input_graphs_e"),
@@ -44,20 +174,29 @@ def show() -> None:
                     sg.InputText(key="input_ignore"),
                     sg.Text("or"),
                     sg.Text("Search**", tooltip=help_search),
-                    sg.InputText(key="input_search")]
+                    sg.InputText(key="input_search"),
+                    sg.Checkbox("Ignore case", default=False, key="input_case_insensitive",
+                                tooltip=help_case_insensitive)]
     layout_row_6 = [sg.Text("Minimum labeling percentage", tooltip=help_minimum_labeling_percentage),
                     sg.InputText("0.0", key="input_minimum_labeling_percentage"),
-                    sg.Text("%")]
+                    sg.Text("%"),
+                    sg.Text("Top labels", tooltip=help_top_labels),
+                    sg.InputText("0", key="input_top_labels")]
     layout_row_7 = [sg.Text("Start date", tooltip=help_start_date),
                     sg.InputText("YYYY-MM-DD", key="input_start_date"),
                     sg.CalendarButton("Calendar", format="%Y-%m-%d")]
     layout_row_8 = [sg.Text("End date", tooltip=help_end_date),
                     sg.InputText("YYYY-MM-DD", key="input_end_date"),
                     sg.CalendarButton("Calendar", format="%Y-%m-%d")]
-    layout_row_9 = [sg.OK()]
-    layout_row_10 = [sg.HorizontalSeparator()]
-    layout_row_11 = [sg.Text("* Required.")]
-    layout_row_12 = [sg.Text("** Labels separated by commas only.")]
+    layout_row_9 = [sg.Text("Breakdown", tooltip=help_breakdown),
+                    sg.Combo(["", "week", "month", "year"], default_value="", readonly=True, key="input_breakdown")]
+    layout_row_10 = [sg.OK()]
+    layout_row_11 = [sg.ProgressBar(3, orientation="h", size=(20, 20), key="output_progress"),
+                     sg.Text("", size=(60, 1), key="output_status")]
+    layout_row_12 = [sg.Multiline("", size=(100, 10), font=("Courier", 10), disabled=True, key="output_breakdown")]
+    layout_row_13 = [sg.HorizontalSeparator()]
+    layout_row_14 = [sg.Text("* Required.")]
+    layout_row_15 = [sg.Text("** Labels or patterns separated by commas only.")]
     layout = [layout_row_0,
               layout_row_1,
               layout_row_2,
@@ -70,49 +209,45 @@ def show() -> None:
               layout_row_9,
               layout_row_10,
               layout_row_11,
-              layout_row_12]
+              layout_row_12,
+              layout_row_13,
+              layout_row_14,
+              layout_row_15]
 
     # Create window
     window = sg.Window("WakaFree", layout)
 
     # Window event loop
+    loaded_file = LoadedFile()
     while True:
         event, values = window.read()
         if event in (sg.WIN_CLOSED, "Cancel"):
             break
         elif event == "OK":
-            Args.file_name = values["input_file"]
-
-            Args.graphs = ""
-            Args.graphs += "l" if values["input_graphs_l"] else ""
-            Args.graphs += "e" if values["input_graphs_e"] else ""
-            Args.graphs += "o" if values["input_graphs_o"] else ""
-
-            Args.totals = ""
-            Args.totals += "l" if values["input_totals_l"] else ""
-            Args.totals += "e" if values["input_totals_e"] else ""
-            Args.totals += "o" if values["input_totals_o"] else ""
-
-            Args.ignored_stats = values["input_ignore"].split(",") if values["input_ignore"] != "" else []
-
-            Args.searched_stats = values["input_search"].split(",") if values["input_search"] != "" else []
-
-            Args.minimum_labeling_percentage = float(values["input_minimum_labeling_percentage"])
-
             try:
-                Args.start_date = datetime.date(int(values["input_start_date"][0:4]),
-                                                int(values["input_start_date"][5:7]),
-                                                int(values["input_start_date"][8:10]))
-            except ValueError:
-                Args.start_date = datetime.date(1, 1, 1)
-
-            try:
-                Args.end_date = datetime.date(int(values["input_end_date"][0:4]),
-                                              int(values["input_end_date"][5:7]),
-                                              int(values["input_end_date"][8:10]))
-            except ValueError:
-                Args.end_date = datetime.date(9999, 12, 31)
-
-            break
+                process_options = read_options(values, options)
+            except ValueError as error:
+                window["output_status"].update("Invalid value: {0}".format(error))
+                continue
+
+            # Process in the background so that the window can be used in the meantime
+            window["OK"].update(disabled=True)
+            window["output_progress"].update(0)
+            window["output_breakdown"].update("")
+            threading.Thread(target=process, args=(window, process_options, loaded_file), daemon=True).start()
+        elif event == "progress":
+            step, message = values[event]
+            window["output_progress"].update(step)
+            window["output_status"].update(message)
+        elif event == "output":
+            window["output_breakdown"].update(values[event])
+        elif event == "done":
+            window["output_progress"].update(3)
+            window["output_status"].update("Done in {0:.2f} s.".format(values[event]))
+            window["OK"].update(disabled=False)
+        elif event == "error":
+            window["output_progress"].update(0)
+            window["output_status"].update("Error: {0}".format(values[event]))
+            window["OK"].update(disabled=False)
 
     window.close()
@@ -0,0 +1,96 @@
+import json
+import os
+
+import Profiling
+import Reader
+
+
+# WakaTime keeps updating the latest days for a while, so this many stored days are compared again on each ingest
+lookback_days: int = 7
+
+
+def trim_day(day: dict) -> dict:
+    """Leave out everything from a day that is not needed for drawing the stats.
+
+    :param day: Day from WakaTime JSON file.
+    :return: Day with the date and the names and times of stats of each type.
+    """
+    trimmed_day = {"date": day["date"]}
+    for key, stats in day.items():
+        # Keep lists of stats such as languages and editors
+        if isinstance(stats, list) and all(isinstance(stat, dict) and "name" in stat and "total_seconds" in stat
+                                           for stat in stats):
+            trimmed_day[key] = [{"name": stat["name"], "total_seconds": stat["total_seconds"]} for stat in stats]
+    return trimmed_day
+
+
+def read_last_days(store_path: str, count: int) -> tuple[int, list[str]]:
+    """Read the last lines of a history store by reading the file backwards.
+
+    :param store_path: History store path.
+    :param count: Number of lines to read.
+    :return: Byte offset of the first returned line and the lines without line breaks.
+    """
+    with open(store_path, "rb") as store:
+        end = store.seek(0, os.SEEK_END)
+        position = end
+        data = b""
+
+        # Read blocks from the end until there are enough complete lines
+        while position > 0 and data.count(b"\n") <= count:
+            block_size = min(65536, position)
+            position -= block_size
+            store.seek(position)
+            data = store.read(block_size) + data
+
+    lines = data.splitlines(keepends=True)
+    if position > 0:
+        # The first line might be cut
+        lines = lines[1:]
+    lines = lines[-count:] if count > 0 else []
+
+    return end - sum(len(line) for line in lines), [line.decode("utf-8").rstrip("\n") for line in lines]
+
+
+@Profiling.Stage("ingest")
+def ingest(export_path: str, store_path: str) -> tuple[int, int]:
+    """Add new and changed days from a WakaTime JSON file to a history store.
+
+    The history store is a JSON Lines file with one trimmed day per line in date order. Only days after the stored
+    days, and the last stored days which WakaTime may still have updated, are written.
+
+    :param export_path: WakaTime JSON file path.
+    :param store_path: History store path.
+    :return: Numbers of added and updated days.
+    """
+    if os.path.exists(store_path):
+        offset, lines = read_last_days(store_path, lookback_days)
+    else:
+        offset, lines = 0, []
+
+    # Stored days that may still change
+    stored_days = {json.loads(line)["date"]: line for line in lines}
+    cutoff_date = min(stored_days.keys(), default="")
+    last_stored_date = max(stored_days.keys(), default="")
+
+    # Read days that are new or may have changed
+    days = dict(stored_days)
+    added_days = 0
+    updated_days = 0
+    for day in Reader.read_days(export_path):
+        if day["date"] < cutoff_date:
+            continue
+
+        line = json.dumps(trim_day(day), separators=(",", ":"))
+        if day["date"] > last_stored_date:
+            added_days += 1
+        elif days.get(day["date"]) != line:
+            updated_days += 1
+        days[day["date"]] = line
+
+    # Replace the last stored days and append the new ones
+    with open(store_path, "ab") as store:
+        store.truncate(offset)
+        store.write("".join(days[date] + "\n" for date in sorted(days.keys())).encode("utf-8"))
+
+    return added_days, updated_days
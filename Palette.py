@@ -0,0 +1,123 @@
+import json
+import os.path
+import tempfile
+import threading
+
+import Cache
+import Data
+import Profiling
+
+
+project_directory: str = os.path.dirname(__file__)
+colors_file_paths: dict[Data.StatsType, str] = {
+    Data.StatsType.LANGUAGES: os.path.join(project_directory, "Colors/languages_colors.yaml"),
+    Data.StatsType.EDITORS: os.path.join(project_directory, "Colors/editors_colors.yaml"),
+    Data.StatsType.OPERATING_SYSTEMS: os.path.join(project_directory, "Colors/operating_systems_colors.yaml"),
+}
+
+# Color used for labels without a color if the colors file does not have a color for the label Other
+default_color: str = "#1f9aef"
+
+
+class Palette:
+    """Colors for the labels of one type of stats.
+
+    :ivar colors: Colors. Keys are labels such as Python, values are colors such as #3572A5.
+    :ivar other_color: Color for labels that do not have their own color.
+    """
+
+    def __init__(self, colors: dict[str, str]) -> None:
+        """Initialize the palette.
+
+        :param colors: Colors. Keys are labels such as Python, values are colors such as #3572A5.
+        """
+        self.colors = colors
+        self.other_color = colors.get("Other", default_color)
+
+    def color(self, label: str) -> str:
+        """Get the color of a label.
+
+        :param label: Label such as Python.
+        :return: Color of the label, or the color of the label Other if the label does not have its own color.
+        """
+        return self.colors.get(label, self.other_color)
+
+
+# Palettes by type of stats and user's colors file
+palettes: dict[tuple[Data.StatsType, str], Palette] = {}
+palettes_lock: threading.Lock = threading.Lock()
+
+
+def read_colors_file(colors_file_path: str) -> dict[str, str]:
+    """Read colors from a YAML file.
+
+    :param colors_file_path: Path of the YAML file. Each label has a mapping with the key color.
+    :return: Colors. Keys are labels, values are colors.
+    """
+    # PyYAML is needed only if the compiled colors are missing or out of date
+    import yaml
+
+    with open(colors_file_path, "r") as colors_file:
+        colors_data = yaml.safe_load(colors_file) or {}
+
+    return {str(label): data["color"] for label, data in colors_data.items()}
+
+
+@Profiling.Stage("load_colors")
+def load_colors_file(colors_file_path: str, cache: bool = True) -> dict[str, str]:
+    """Load colors from a YAML file, using the compiled colors in the cache when the file has not changed.
+
+    :param colors_file_path: Path of the YAML file.
+    :param cache: Whether to read and write compiled colors.
+    :return: Colors. Keys are labels, values are colors.
+    """
+    status = os.stat(colors_file_path)
+    source = {"path": os.path.abspath(colors_file_path), "size": status.st_size, "mtime": status.st_mtime_ns}
+    compiled_file_path = os.path.join(Cache.cache_directory,
+                                      "colors-" + os.path.splitext(os.path.basename(colors_file_path))[0] + ".json")
+
+    # Use compiled colors if they were compiled from the same file
+    if cache:
+        try:
+            with open(compiled_file_path, "r") as compiled_file:
+                compiled = json.load(compiled_file)
+            if compiled["source"] == source:
+                return compiled["colors"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    colors = read_colors_file(colors_file_path)
+
+    # Compile colors for the next runs
+    if cache:
+        try:
+            os.makedirs(Cache.cache_directory, exist_ok=True)
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=Cache.cache_directory, suffix=".tmp")
+            with os.fdopen(file_descriptor, "w") as compiled_file:
+                json.dump({"source": source, "colors": colors}, compiled_file)
+            os.replace(temporary_path, compiled_file_path)
+        except OSError:
+            # Colors are read from the colors file again on the next run
+            pass
+
+    return colors
+
+
+def get(type_: Data.StatsType, colors_file_name: str = "", cache: bool = True) -> Palette:
+    """Get the palette for a type of stats. Colors files are read only once per process.
+
+    :param type_: Type of the stats.
+    :param colors_file_name: YAML file with colors that replace or add to the default colors, or an empty string.
+    :param cache: Whether to read and write compiled colors.
+    :return: Palette.
+    """
+    with palettes_lock:
+        if (type_, colors_file_name) not in palettes:
+            colors = load_colors_file(colors_file_paths[type_], cache) if type_ in colors_file_paths else {}
+
+            # User's colors replace or add to the colors of all types
+            if colors_file_name != "":
+                colors.update(read_colors_file(colors_file_name))
+            palettes[(type_, colors_file_name)] = Palette(colors)
+
+        return palettes[(type_, colors_file_name)]
@@ -1,134 +1,298 @@
-import os.path
-import datetime
+import concurrent.futures
+import dataclasses
+import html
+import os
 
-import yaml
+import numpy as np
 import plotly.graph_objects as go
-import plotly.express as px
+import plotly.io as pio
+import plotly.offline
 
 import Args
 import Data
+import Palette
+import Profiling
 
 
-project_directory: str = os.path.dirname(__file__)
-colors_file_path_languages: str = os.path.join(project_directory, "Colors/languages_colors.yaml")
-colors_file_path_editors: str = os.path.join(project_directory, "Colors/editors_colors.yaml")
-colors_file_path_operating_systems: str = os.path.join(project_directory, "Colors/operating_systems_colors.yaml")
+@dataclasses.dataclass
+class Chart:
+    """Data class for storing a figure and what it shows.
 
+    :ivar type_: Type of the stats shown in the figure.
+    :ivar kind: Kind of the figure: graphs for daily stats or totals for total times.
+    :ivar figure: Figure.
+    """
+    type_: Data.StatsType
+    kind: str
+    figure: go.Figure
+
+    def title(self) -> str:
+        """Get the title of the chart.
+
+        :return: Type of the stats, followed by (total) for total times.
+        """
+        return self.type_.name.replace("_", " ").capitalize() + (" (total)" if self.kind == "totals" else "")
+
+
+# Traces are drawn with WebGL instead of SVG when a graph has more points than this
+webgl_point_count: int = 10000
+
+
+def downsample(x: np.ndarray, y: np.ndarray, maximum_points: int) -> np.ndarray:
+    """Choose points that keep the shape of a line with the Largest-Triangle-Three-Buckets algorithm.
+
+    The first and the last points are always chosen. The points between them are split into buckets, and from each
+    bucket the point forming the largest triangle with the previously chosen point and the average of the next
+    bucket is chosen.
+
+    :param x: X coordinates in increasing order.
+    :param y: Y coordinates.
+    :param maximum_points: Maximum number of points to choose.
+    :return: Indices of the chosen points.
+    """
+    point_count = len(y)
+    if maximum_points >= point_count or maximum_points < 3:
+        return np.arange(point_count)
+
+    x = x.astype(float)
+    bucket_edges = np.linspace(1, point_count - 1, maximum_points - 1).astype(np.intp)
+    indices = np.empty(maximum_points, dtype=np.intp)
+    indices[0] = 0
+    indices[-1] = point_count - 1
+
+    for bucket in range(maximum_points - 2):
+        start, end = bucket_edges[bucket], bucket_edges[bucket + 1]
+
+        # Average point of the next bucket, or the last point after the last bucket
+        if bucket + 2 < len(bucket_edges):
+            next_x = x[end:bucket_edges[bucket + 2]].mean()
+            next_y = y[end:bucket_edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        # Twice the areas of the triangles
+        previous = indices[bucket]
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        indices[bucket + 1] = start + np.argmax(areas)
+
+    return indices
 
-def draw_graphs(dates: list[datetime.date], stats: Data.Stats) -> None:
-    """Draw graphs for daily stats.
 
-    :param dates: Dates.
-    :param stats: Stats.
+def encode_dates(dates: np.ndarray) -> dict:
+    """Encode the dates of a trace compactly.
+
+    Evenly spaced dates are given as the first date and the step. Other dates are given as strings without the time of
+    the day, which Plotly would otherwise add to each date.
+
+    :param dates: Dates as datetime64.
+    :return: Keyword arguments x0 and dx, or x, for a trace.
+    """
+    steps = np.diff(dates.astype("datetime64[D]").astype(np.int64))
+    if len(steps) > 0 and (steps == steps[0]).all():
+        return dict(x0=str(dates[0]), dx=int(steps[0]) * 24 * 60 * 60 * 1000)
+    return dict(x=np.datetime_as_string(dates, unit="D"))
+
+
+@Profiling.Stage("create_graphs")
+def create_graphs(analysis: Data.Analysis, stats: Data.Stats) -> go.Figure:
+    """Create graphs for daily stats.
+
+    :param analysis: Processed stats.
+    :param stats: Object containing stats of the analysis.
+    :return: Figure with a line for each label.
     """
-    match stats.type_:
-        case Data.StatsType.LANGUAGES:
-            colors_file_path = colors_file_path_languages
-        case Data.StatsType.EDITORS:
-            colors_file_path = colors_file_path_editors
-        case Data.StatsType.OPERATING_SYSTEMS:
-            colors_file_path = colors_file_path_operating_systems
-        case _:
-            colors_file_path = None
-
-    with open(colors_file_path, "r") as colors_file:
-        colors_data = yaml.safe_load(colors_file)
-
-        fig = go.Figure()
-
-        for key in stats.daily_stats.keys():
-            try:
-                color = colors_data[key]["color"]
-            except KeyError:
-                color = colors_data["Other"]["color"]
-
-            fig.add_trace(go.Scatter(x=dates,
-                                     y=stats.daily_stats[key],
-                                     mode="lines",
-                                     name=key,
-                                     marker=dict(color=color)))
+    options = analysis.options
+    palette = Palette.get(stats.type_, options.colors_file_name, options.cache)
+
+    # Add up hours for each week or month
+    if options.resample != "day":
+        dates, hours = Data.period_total_hours(analysis, stats, options.resample)
+    else:
+        dates, hours = Data.ordinals_to_datetime64(analysis.date_ordinals), stats.hours
+
+    # Lines of the labels that are not among the largest in any period are added under the label Other
+    labels, hours = Data.group_top_labels_per_period(stats.labels, hours, options.top_labels_per_period)
+
+    # SVG gets slow with a lot of points
+    maximum_points = options.maximum_points
+    points_per_trace = min(hours.shape[1], maximum_points) if maximum_points > 0 else hours.shape[1]
+    point_count = hours.shape[0] * points_per_trace
+    scatter = go.Scattergl if point_count > webgl_point_count else go.Scatter
+
+    fig = go.Figure()
+
+    for key, key_hours in zip(labels, hours):
+        indices = downsample(dates.astype(np.int64), key_hours, maximum_points) if maximum_points > 0 \
+            else slice(None)
+        fig.add_trace(scatter(**encode_dates(dates[indices]),
+                              y=key_hours[indices].astype(np.float32, copy=False),
+                              mode="lines",
+                              name=key,
+                              marker=dict(color=palette.color(key))))
 
     fig.update_layout(yaxis_title="t (h)", plot_bgcolor="white")
-    fig.update_xaxes(showline=True, linewidth=1, linecolor="black", mirror=True)
+    fig.update_xaxes(type="date", showline=True, linewidth=1, linecolor="black", mirror=True)
     fig.update_yaxes(showline=True, linewidth=1, linecolor="black", mirror=True)
 
-    fig.show()
+    return fig
 
 
-def draw_pie_chart(stats: Data.Stats) -> None:
-    """Draw chart showing total times.
+@Profiling.Stage("create_pie_chart")
+def create_pie_chart(analysis: Data.Analysis, stats: Data.Stats) -> go.Figure:
+    """Create chart showing total times.
 
-    :param stats: Stats.
+    :param analysis: Processed stats.
+    :param stats: Object containing stats of the analysis.
+    :return: Pie chart with a slice for each label.
     """
-    match stats.type_:
-        case Data.StatsType.LANGUAGES:
-            colors_file_path = colors_file_path_languages
-        case Data.StatsType.EDITORS:
-            colors_file_path = colors_file_path_editors
-        case Data.StatsType.OPERATING_SYSTEMS:
-            colors_file_path = colors_file_path_operating_systems
-        case _:
-            colors_file_path = None
-
+    palette = Palette.get(stats.type_, analysis.options.colors_file_name, analysis.options.cache)
     labels = []
     colors = []
 
-    total_hours = 0.0
+    # Total time for each key and for all keys together
+    total_hours = stats.total_hours()
+    grand_total_hours = total_hours.sum()
 
-    with open(colors_file_path, "r") as colors_file:
-        colors_data = yaml.safe_load(colors_file)
+    # Loop keys
+    for key, hours in zip(stats.labels, total_hours):
+        # Add label to list
+        labels.append(key + " - {0} h {1} min".format(int(hours), int((hours - int(hours)) * 60)))
+        colors.append(palette.color(key))
 
-        # Loop keys
-        for key in stats.daily_stats.keys():
-            # Get total time for current key
-            hours = sum(stats.daily_stats[key])
+        # Add percent sign to legends
+        labels[-1] += " ({0:.2f} %)".format(hours / grand_total_hours * 100)
 
-            # Add time to total time of all keys
-            total_hours += hours
+    fig = go.Figure(go.Pie(labels=labels,
+                           values=total_hours,
+                           marker=dict(colors=colors, line=dict(color="black", width=0.5)),
+                           textinfo="none",
+                           hovertemplate=labels))
 
-            # Add label to list
-            labels.append(key + " - {0} h {1} min".format(int(hours), int((hours - int(hours)) * 60)))
-            try:
-                colors.append(colors_data[key]["color"])
-            except KeyError:
-                colors.append(colors_data["Other"]["color"])
+    return fig
 
-    # Add percent sign to legends
-    for index, key in enumerate(stats.daily_stats.keys()):
-        hours = sum(stats.daily_stats[key])
-        labels[index] += " ({0:.2f} %)".format(hours / total_hours * 100)
 
-    fig = px.pie(names=labels,
-                 values=[sum(hours) for hours in stats.daily_stats.values()],
-                 color_discrete_sequence=colors)
-    fig.update_traces(marker=dict(line=dict(color="black", width=0.5)), textinfo="none", hovertemplate=labels)
+def create_charts(analysis: Data.Analysis) -> list[Chart]:
+    """Create all charts requested in the options of an analysis.
 
-    fig.show()
-
-
-def plot() -> None:
-    """Plot data."""
+    :param analysis: Processed stats.
+    :return: Graphs and pie charts, graphs first.
+    """
+    options = analysis.options
+    charts = []
 
     # Daily stats
-    if Args.graphs != "" or (Args.graphs == "" and Args.totals == ""):
-        # Languages
-        if "l" in Args.graphs.lower():
-            draw_graphs(Data.dates, Data.languages_stats)
-        # Editors
-        if "e" in Args.graphs.lower():
-            draw_graphs(Data.dates, Data.editors_stats)
-        # Operating systems
-        if "o" in Args.graphs.lower():
-            draw_graphs(Data.dates, Data.operating_systems_stats)
+    if options.graphs != "" or (options.graphs == "" and options.totals == ""):
+        for letter, type_ in Data.stats_types_by_letter.items():
+            if letter in options.graphs.lower() and type_ in analysis.stats:
+                charts.append(Chart(type_, "graphs", create_graphs(analysis, analysis.stats[type_])))
 
     # Total times
-    if Args.totals != "" or (Args.graphs == "" and Args.totals == ""):
-        # Languages
-        if "l" in Args.totals.lower():
-            draw_pie_chart(Data.languages_stats)
-        # Editors
-        if "e" in Args.totals.lower():
-            draw_pie_chart(Data.editors_stats)
-        # Operating systems
-        if "o" in Args.totals.lower():
-            draw_pie_chart(Data.operating_systems_stats)
+    if options.totals != "" or (options.graphs == "" and options.totals == ""):
+        for letter, type_ in Data.stats_types_by_letter.items():
+            if letter in options.totals.lower() and type_ in analysis.stats:
+                charts.append(Chart(type_, "totals", create_pie_chart(analysis, analysis.stats[type_])))
+
+    return charts
+
+
+@Profiling.Stage("write_dashboard")
+def write_dashboard(charts: list[Chart], html_file_path: str) -> None:
+    """Write charts into one HTML file that works without a network connection.
+
+    Plotly.js is included only once and shared by all the charts. The file is replaced only after it has been written
+    completely, so a browser never loads a partly written file.
+
+    :param charts: Charts.
+    :param html_file_path: Path of the HTML file to write.
+    """
+    with open(html_file_path + ".tmp", "w", encoding="utf-8") as html_file:
+        html_file.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>WakaFree</title>\n'
+                        '<script type="text/javascript">')
+        html_file.write(plotly.offline.get_plotlyjs())
+        html_file.write("</script>\n</head>\n<body>\n")
+
+        for chart in charts:
+            html_file.write("<h2>{0}</h2>\n".format(html.escape(chart.title())))
+            html_file.write(chart.figure.to_html(full_html=False, include_plotlyjs=False, default_height="600px"))
+            html_file.write("\n")
+
+        html_file.write("</body>\n</html>\n")
+
+    os.replace(html_file_path + ".tmp", html_file_path)
+
+
+def find_image_export_problem() -> str:
+    """Check that Kaleido can render images, without rendering any.
+
+    :return: Description of what is missing, or an empty string if images can be rendered.
+    """
+    import kaleido
+
+    # Kaleido 1 renders with Chrome, which is installed separately. Creating the renderer looks for Chrome but does not
+    # start it.
+    if hasattr(kaleido, "write_fig_from_object_sync"):
+        try:
+            kaleido.Kaleido()
+        except RuntimeError as error:
+            return str(error)
+
+    return ""
+
+
+@Profiling.Stage("export_images")
+def export_images(charts: list[Chart], options: Args.Options) -> list[str]:
+    """Render charts into image files without a browser window.
+
+    :param charts: Charts.
+    :param options: Options with the directory, the file name pattern and the formats of the images.
+    :return: Paths of the written files.
+    """
+    os.makedirs(options.export_directory, exist_ok=True)
+
+    figures = []
+    file_paths = []
+    for index, chart in enumerate(charts):
+        file_name = options.export_name.format(type=chart.type_.name.lower(), kind=chart.kind, index=index + 1)
+        for image_format in options.export_formats:
+            figures.append(chart.figure)
+            file_paths.append(os.path.join(options.export_directory, file_name + "." + image_format))
+
+    # Arguments are checked for Kaleido and Chrome before anything is read
+    import kaleido
+
+    # Kaleido 1 renders the images in tabs of one browser process, several images at a time
+    if hasattr(kaleido, "write_fig_from_object_sync"):
+        worker_count = min(options.jobs if options.jobs > 0 else os.cpu_count() or 1, len(figures))
+        kaleido.write_fig_from_object_sync([dict(fig=figure, path=file_path) for figure, file_path
+                                            in zip(figures, file_paths)], kopts=dict(n=max(worker_count, 1)))
+
+    # Older versions render with one process that is started once and reused, and the figures are converted to JSON
+    # in parallel while it is busy
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=options.jobs if options.jobs > 0 else None) as executor:
+            list(executor.map(pio.write_image, figures, file_paths))
+
+    return file_paths
+
+
+def plot(analysis: Data.Analysis) -> None:
+    """Plot data.
+
+    Charts are written into an HTML file and into image files if the options have them, and shown in the browser
+    otherwise.
+
+    :param analysis: Processed stats.
+    """
+    options = analysis.options
+    charts = create_charts(analysis)
+
+    if options.html_file_name != "":
+        write_dashboard(charts, options.html_file_name)
+    if options.export_directory != "":
+        for file_path in export_images(charts, options):
+            print(file_path)
+    if options.html_file_name == "" and options.export_directory == "":
+        for chart in charts:
+            with Profiling.Stage("show"):
+                chart.figure.show()
@@ -0,0 +1,150 @@
+import dataclasses
+import functools
+import json
+import os
+import threading
+import time
+import typing
+
+# tracemalloc imports pickle, so it is imported only when stages are measured to keep the startup fast
+
+
+@dataclasses.dataclass
+class StageResult:
+    """Data class for storing measurements of a stage.
+
+    :ivar calls: Number of times the stage was run.
+    :ivar time: Total wall time in seconds.
+    :ivar peak_memory: Largest amount of memory in bytes allocated during the stage on top of the memory allocated
+                       before the stage.
+    """
+    calls: int = 0
+    time: float = 0.0
+    peak_memory: int = 0
+
+
+enabled: bool = False
+results: dict[str, StageResult] = {}
+events: list[dict] = []
+results_lock: threading.Lock = threading.Lock()
+thread_data: threading.local = threading.local()
+start_time: float = time.perf_counter()
+
+
+class Stage:
+    """Context manager and decorator that measures a stage when profiling is enabled.
+
+    :ivar name: Name of the stage.
+    """
+
+    def __init__(self, name: str) -> None:
+        """Initialize the stage.
+
+        :param name: Name of the stage.
+        """
+        self.name = name
+
+    def __call__(self, function: typing.Callable) -> typing.Callable:
+        """Measure every call of a function.
+
+        :param function: Function to measure.
+        :return: Function that calls the given function, measuring it if profiling is enabled.
+        """
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with Stage(self.name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    def __enter__(self) -> "Stage":
+        if not enabled:
+            return self
+        import tracemalloc
+
+        # Stages that are running in this thread. Each has the memory at its start and its peak memory so far.
+        stack = thread_data.__dict__.setdefault("stack", [])
+
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        if len(stack) > 0:
+            stack[-1][1] = max(stack[-1][1], peak_memory)
+        tracemalloc.reset_peak()
+        stack.append([current_memory, current_memory])
+
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception_info) -> None:
+        if not enabled or not hasattr(self, "start_time"):
+            return
+        import tracemalloc
+
+        end_time = time.perf_counter()
+        stack = thread_data.stack
+        start_memory, peak_memory = stack.pop()
+        peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+        if len(stack) > 0:
+            stack[-1][1] = max(stack[-1][1], peak_memory)
+
+        with results_lock:
+            result = results.setdefault(self.name, StageResult())
+            result.calls += 1
+            result.time += end_time - self.start_time
+            result.peak_memory = max(result.peak_memory, peak_memory - start_memory)
+            events.append({"name": self.name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                           "ts": (self.start_time - start_time) * 1e6, "dur": (end_time - self.start_time) * 1e6,
+                           "args": {"peak_memory": peak_memory - start_memory}})
+
+
+def enable(trace_memory: bool = True) -> None:
+    """Start measuring stages.
+
+    :param trace_memory: Whether to measure peak memory too. Tracing memory slows everything down.
+    """
+    global enabled
+
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+    enabled = True
+
+
+def disable() -> None:
+    """Stop measuring stages. The measurements are kept."""
+    global enabled
+
+    enabled = False
+    import tracemalloc
+    tracemalloc.stop()
+
+
+def reset() -> None:
+    """Forget all measurements."""
+    with results_lock:
+        results.clear()
+        events.clear()
+
+
+def format_summary() -> str:
+    """Format the measurements as a table.
+
+    :return: Table with a row for each stage in the order the stages were first finished.
+    """
+    lines = ["{0:<20} {1:>7} {2:>12} {3:>10}".format("Stage", "Calls", "Time (ms)", "Peak (MB)")]
+    with results_lock:
+        for name, result in results.items():
+            lines.append("{0:<20} {1:>7} {2:>12.1f} {3:>10.2f}".format(name, result.calls, result.time * 1000,
+                                                                       result.peak_memory / 1024 ** 2))
+    return "\n".join(lines)
+
+
+def write_trace(trace_file_path: str) -> None:
+    """Write the measurements in the Trace Event Format, which can be opened in chrome://tracing or Perfetto.
+
+    :param trace_file_path: Path of the file to write.
+    """
+    with results_lock:
+        with open(trace_file_path, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
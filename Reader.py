@@ -0,0 +1,258 @@
+import bz2
+import contextlib
+import gzip
+import io
+import json
+import lzma
+import typing
+import zipfile
+
+
+# Compressed files are recognized from their first bytes. Each format has the extension that is left out of the name
+# of the decompressed file.
+compression_formats: dict[str, tuple[bytes, str, typing.Callable]] = {
+    "gzip": (b"\x1f\x8b", ".gz", gzip.open),
+    "bzip2": (b"BZh", ".bz2", bz2.open),
+    "xz": (b"\xfd7zXZ\x00", ".xz", lzma.open),
+}
+zip_signature: bytes = b"PK\x03\x04"
+
+
+class JSONStream:
+    """Reader for decoding a JSON document from a file piece by piece.
+
+    :ivar file: Opened JSON file.
+    :ivar chunk_size: Number of characters read from the file at a time.
+    :ivar buffer: Characters read from the file but not yet consumed.
+    :ivar position: Position of the next unconsumed character in the buffer.
+    :ivar end_of_file: Whether the whole file has been read.
+    :ivar offset: Number of characters in the file before the buffer.
+    """
+
+    def __init__(self, file: typing.TextIO, chunk_size: int = 65536, offset: int = 0) -> None:
+        """Initialize the stream.
+
+        :param file: Opened JSON file.
+        :param chunk_size: Number of characters read from the file at a time.
+        :param offset: Number of characters already read from the file.
+        """
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.end_of_file = False
+        self.offset = offset
+        self.decoder = json.JSONDecoder()
+
+    def read_chunk(self) -> bool:
+        """Read the next chunk from the file and drop the consumed part of the buffer.
+
+        :return: False if there was nothing left to read, True otherwise.
+        """
+        chunk = self.file.read(self.chunk_size)
+        if chunk == "":
+            self.end_of_file = True
+            return False
+
+        self.offset += self.position
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def tell(self) -> int:
+        """Get the position of the next unconsumed character in the file.
+
+        :return: Number of characters in the file before the next unconsumed character.
+        """
+        return self.offset + self.position
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it.
+
+        :return: Next character or an empty string at the end of the file.
+        """
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in " \t\n\r":
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_chunk():
+                return ""
+
+    def consume(self, character: str) -> None:
+        """Consume the given structural character.
+
+        :param character: Expected character such as { or :.
+        """
+        if self.peek() != character:
+            raise ValueError("Expected '{0}' in JSON file but found '{1}'.".format(character, self.peek()))
+        self.position += 1
+
+    def decode(self) -> typing.Any:
+        """Decode the next complete JSON value.
+
+        :return: Decoded value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+
+                # A value ending at the end of the buffer (e.g. a number) might continue in the next chunk
+                if end < len(self.buffer) or self.end_of_file:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.end_of_file:
+                    raise
+            self.read_chunk()
+
+
+def iter_array(stream: JSONStream,
+               offsets: typing.MutableSequence[int] | None = None) -> typing.Iterator[typing.Any]:
+    """Iterate over the rest of the values of an array.
+
+    :param stream: Stream positioned at a value of the array or at its end.
+    :param offsets: List or deque to append the position of each value in the file to, or None.
+    :return: Generator yielding values of the array.
+    """
+    if stream.peek() != "]":
+        while True:
+            if offsets is not None:
+                offsets.append(stream.tell())
+            yield stream.decode()
+            if stream.peek() != ",":
+                break
+            stream.consume(",")
+    stream.consume("]")
+
+
+def iter_lines(file: typing.TextIO, offset: int = 0,
+               offsets: typing.MutableSequence[int] | None = None) -> typing.Iterator[dict]:
+    """Iterate over the rest of the days of a history store.
+
+    :param file: Opened history store positioned at the start of a line.
+    :param offset: Number of characters already read from the file.
+    :param offsets: List or deque to append the position of each day in the file to, or None.
+    :return: Generator yielding days from the history store.
+    """
+    for line in file:
+        if line.strip() != "":
+            if offsets is not None:
+                offsets.append(offset)
+            yield json.loads(line)
+        offset += len(line)
+
+
+def iter_days(file: typing.TextIO, offsets: typing.MutableSequence[int] | None = None) -> typing.Iterator[dict]:
+    """Iterate over the days of a WakaTime JSON file without loading the whole file.
+
+    Only one day at a time is kept in memory. Other top level values are decoded and discarded.
+
+    :param file: Opened WakaTime JSON file.
+    :param offsets: List or deque to append the position of each day in the file to, or None.
+    :return: Generator yielding days from WakaTime JSON file.
+    """
+    stream = JSONStream(file)
+
+    stream.consume("{")
+    if stream.peek() == "}":
+        return
+
+    # Loop top level keys
+    while True:
+        key = stream.decode()
+        stream.consume(":")
+
+        if key == "days":
+            # Yield days one by one
+            stream.consume("[")
+            yield from iter_array(stream, offsets)
+        else:
+            stream.decode()
+
+        if stream.peek() != ",":
+            break
+        stream.consume(",")
+
+    stream.consume("}")
+
+
+@contextlib.contextmanager
+def open_file(file_path: str) -> typing.Iterator[tuple[typing.TextIO, str]]:
+    """Open a WakaTime JSON file or a history store for reading text, decompressing it while it is read if needed.
+
+    Files compressed with gzip, bzip2 or xz, and zip archives, are recognized from their contents. The decompressed
+    text is never written to the disk or kept in memory as a whole.
+
+    :param file_path: Path of the file, which may be compressed.
+    :return: Context manager giving the opened file and the name of the decompressed file, such as stats.json.
+    """
+    with open(file_path, "rb") as raw_file:
+        signature = raw_file.read(8)
+
+    for magic_bytes, extension, open_compressed in compression_formats.values():
+        if signature.startswith(magic_bytes):
+            name = file_path[:-len(extension)] if file_path.lower().endswith(extension) else file_path
+            with open_compressed(file_path, "rt") as file:
+                yield file, name
+            return
+
+    if signature.startswith(zip_signature):
+        with zipfile.ZipFile(file_path) as archive:
+            # Archive has the file as its only member, or among other files
+            members = [member for member in archive.infolist() if not member.is_dir()]
+            json_members = [member for member in members if member.filename.lower().endswith((".json", ".jsonl"))]
+            if len(json_members) == 0:
+                raise ValueError("No JSON file in {0}.".format(file_path))
+            with archive.open(json_members[0]) as member_file, io.TextIOWrapper(member_file) as file:
+                yield file, json_members[0].filename
+        return
+
+    with open(file_path, "r") as file:
+        yield file, file_path
+
+
+def read_days(file_path: str, offsets: typing.MutableSequence[int] | None = None) -> typing.Iterator[dict]:
+    """Open a WakaTime JSON file or a history store and iterate over its days.
+
+    :param file_path: WakaTime JSON file path or history store path, which may be compressed. History stores have the
+                      extension .jsonl.
+    :param offsets: List or deque to append the position of each day in the file to, or None. Positions are counted in
+                    characters as read in text mode.
+    :return: Generator yielding days from the file.
+    """
+    with open_file(file_path) as (file, name):
+        yield from read_opened_days(file, name, offsets)
+
+
+def read_opened_days(file: typing.TextIO, name: str,
+                     offsets: typing.MutableSequence[int] | None = None) -> typing.Iterator[dict]:
+    """Iterate over the days of a file opened with open_file.
+
+    :param file: File opened with open_file and positioned at its start.
+    :param name: Name of the decompressed file given by open_file. History stores have the extension .jsonl.
+    :param offsets: List or deque to append the position of each day in the file to, or None.
+    :return: Generator yielding days from the file.
+    """
+    if name.endswith(".jsonl"):
+        # History store has one day per line
+        yield from iter_lines(file, 0, offsets)
+    else:
+        yield from iter_days(file, offsets)
+
+
+def read_days_after(file: typing.TextIO, name: str, offset: int,
+                    offsets: typing.MutableSequence[int] | None = None) -> typing.Iterator[dict]:
+    """Iterate over the days of a file starting from the middle of the file.
+
+    :param file: File opened with open_file, with the characters before a day already read.
+    :param name: Name of the decompressed file given by open_file. History stores have the extension .jsonl.
+    :param offset: Number of characters already read from the file. Must be a position given by read_days.
+    :param offsets: List or deque to append the position of each day in the file to, or None.
+    :return: Generator yielding days from the given position to the end of the days.
+    """
+    if name.endswith(".jsonl"):
+        yield from iter_lines(file, offset, offsets)
+    else:
+        yield from iter_array(JSONStream(file, offset=offset), offsets)
@@ -0,0 +1,339 @@
+import asyncio
+import collections
+import datetime
+import json
+import os.path
+import urllib.parse
+
+import numpy as np
+import plotly.offline
+
+import Args
+import Batch
+import Data
+import Palette
+import Profiling
+
+
+# Parsed files kept in memory. The least recently used file is dropped when there are more.
+maximum_exports: int = 8
+
+# Only the computer running the server can connect to it
+host: str = "127.0.0.1"
+
+# Plotly.js encoded once when it is first requested
+plotlyjs_bytes: bytes | None = None
+
+page: str = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>WakaFree</title>
+<script src="/plotly.js"></script>
+</head>
+<body>
+<form id="form">
+<select name="file"></select>
+<select name="type"><option value="l">Languages</option><option value="e">Editors</option>
+<option value="o">Operating systems</option></select>
+<label>Start date <input type="date" name="start"></label>
+<label>End date <input type="date" name="end"></label>
+<label>Minimum labeling percentage <input type="number" name="m" value="0" min="0" max="100" step="0.1"></label>
+<label>Top labels <input type="number" name="top" value="0" min="0" step="1"></label>
+<label>Search <input name="search"></label>
+<label>Ignore <input name="ignore"></label>
+<label><input type="checkbox" name="case" value="1"> Ignore case</label>
+<select name="resample"><option>day</option><option>week</option><option>month</option></select>
+<button>Show</button>
+</form>
+<div id="graphs" style="height: 600px;"></div>
+<div id="totals" style="height: 600px;"></div>
+<script>
+const form = document.getElementById("form");
+
+async function draw() {
+    const response = await fetch("/stats?" + new URLSearchParams(new FormData(form)));
+    const stats = await response.json();
+    if (!response.ok) {
+        alert(stats.error);
+        return;
+    }
+
+    const line = {showline: true, linewidth: 1, linecolor: "black", mirror: true};
+    Plotly.react("graphs", stats.labels.map((label, index) => ({
+        x: stats.dates, y: stats.hours[index], mode: "lines", name: label, marker: {color: stats.colors[index]}
+    })), {yaxis: Object.assign({title: {text: "t (h)"}}, line), xaxis: line, plot_bgcolor: "white"});
+    Plotly.react("totals", [{
+        type: "pie", labels: stats.labels, values: stats.totals, textinfo: "none",
+        marker: {colors: stats.colors, line: {color: "black", width: 0.5}}
+    }], {});
+}
+
+form.addEventListener("submit", event => {
+    event.preventDefault();
+    draw();
+});
+fetch("/files").then(response => response.json()).then(files => {
+    for (const file of files) {
+        form.file.add(new Option(file, file));
+    }
+    draw();
+});
+</script>
+</body>
+</html>
+"""
+
+
+class RequestError(Exception):
+    """Error caused by a request, reported to the client with an HTTP status code.
+
+    :ivar status: HTTP status code such as 404.
+    """
+
+    def __init__(self, status: int, message: str) -> None:
+        """Initialize the error.
+
+        :param status: HTTP status code such as 404.
+        :param message: Message shown to the user.
+        """
+        super().__init__(message)
+        self.status = status
+
+
+class Server:
+    """HTTP server that processes the stats of the files in a directory as requested by the browser.
+
+    :ivar options: Options given as arguments. Requests can change the date range, the labels and the grouping.
+    :ivar exports: Parsed files by path, size and modification time, least recently used first.
+    :ivar loading: Files being parsed by path, size and modification time.
+    """
+
+    def __init__(self, options: Args.Options) -> None:
+        """Initialize the server.
+
+        :param options: Options given as arguments. FILE is the directory of the files, or a single file.
+        """
+        self.options = options
+        self.exports: collections.OrderedDict[tuple, Data.Export] = collections.OrderedDict()
+        self.loading: dict[tuple, asyncio.Future] = {}
+
+    def file_paths(self) -> dict[str, str]:
+        """Find the files that can be requested.
+
+        :return: Paths of the files by file name.
+        """
+        return {os.path.basename(file_path): file_path
+                for file_path in Batch.find_export_files([self.options.file_name])}
+
+    async def get_export(self, file_name: str) -> Data.Export:
+        """Get the parsed stats of a file, parsing the file if it is not in memory.
+
+        :param file_name: Name of the file in the directory.
+        :return: Dates and stats of all types.
+        """
+        file_path = self.file_paths().get(file_name)
+        if file_path is None:
+            raise RequestError(404, "No file named {0}.".format(file_name))
+
+        status = os.stat(file_path)
+        key = (file_path, status.st_size, status.st_mtime_ns)
+
+        if key in self.exports:
+            self.exports.move_to_end(key)
+            return self.exports[key]
+
+        # Parse each file only once even if it is requested many times at the same time
+        if key not in self.loading:
+            self.loading[key] = asyncio.ensure_future(asyncio.to_thread(load_export, file_path, self.options.cache,
+                                                                      self.options.compact))
+        try:
+            export = await asyncio.shield(self.loading[key])
+        finally:
+            self.loading.pop(key, None)
+
+        self.exports[key] = export
+        self.exports.move_to_end(key)
+        while len(self.exports) > maximum_exports:
+            self.exports.popitem(last=False)
+
+        return export
+
+    async def respond(self, path: str, query: dict[str, str]) -> tuple[int, str, bytes]:
+        """Create the response to a request.
+
+        :param path: Path of the requested URL.
+        :param query: Query parameters of the requested URL.
+        :return: HTTP status code, content type and body.
+        """
+        match path:
+            case "/":
+                return 200, "text/html; charset=utf-8", page.encode("utf-8")
+            case "/plotly.js":
+                return 200, "text/javascript; charset=utf-8", plotlyjs()
+            case "/files":
+                return 200, "application/json", json.dumps(sorted(self.file_paths().keys())).encode("utf-8")
+            case "/stats":
+                export = await self.get_export(query.get("file", ""))
+                options = query_options(self.options, query)
+                type_ = Data.stats_types_by_letter.get(query.get("type", "l"))
+                if type_ is None:
+                    raise RequestError(400, "Unknown type of stats: {0}.".format(query.get("type")))
+                stats = aggregate(export, type_, options, query.get("resample", "day"))
+                return 200, "application/json", json.dumps(stats, separators=(",", ":")).encode("utf-8")
+            case _:
+                raise RequestError(404, "Not found.")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer a request from a connection.
+
+        :param reader: Stream for reading the request.
+        :param writer: Stream for writing the response.
+        """
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+
+            # Headers are not needed
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+
+            try:
+                if len(request_line) != 3 or request_line[0] != "GET":
+                    raise RequestError(405, "Only GET requests are supported.")
+                url = urllib.parse.urlsplit(request_line[1])
+                status, content_type, body = await self.respond(url.path,
+                                                                dict(urllib.parse.parse_qsl(url.query)))
+            except RequestError as error:
+                status, content_type = error.status, "application/json"
+                body = json.dumps({"error": str(error)}).encode("utf-8")
+            except ValueError as error:
+                status, content_type = 400, "application/json"
+                body = json.dumps({"error": str(error)}).encode("utf-8")
+
+            writer.write("HTTP/1.1 {0} {1}\r\nContent-Type: {2}\r\nContent-Length: {3}\r\nConnection: close\r\n\r\n"
+                         .format(status, "OK" if status == 200 else "Error", content_type, len(body))
+                         .encode("latin-1") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def plotlyjs() -> bytes:
+    """Get plotly.js, which the page uses for drawing the charts.
+
+    :return: Plotly.js encoded as UTF-8.
+    """
+    global plotlyjs_bytes
+
+    if plotlyjs_bytes is None:
+        plotlyjs_bytes = plotly.offline.get_plotlyjs().encode("utf-8")
+    return plotlyjs_bytes
+
+
+def load_export(file_path: str, cache: bool, compact: bool = False) -> Data.Export:
+    """Parse a file and precompute what the requests are answered from.
+
+    :param file_path: WakaTime JSON file path.
+    :param cache: Whether to read and write cached stats.
+    :param compact: Whether to store the hours as 32-bit floats.
+    :return: Dates and stats of all types with cumulative hours calculated.
+    """
+    export = Data.read_export(file_path, cache, compact)
+    for stats in export.stats.values():
+        stats.cumulative_hours()
+    return export
+
+
+def query_options(options: Args.Options, query: dict[str, str]) -> Args.Options:
+    """Get options for processing the stats from the query parameters of a request.
+
+    :param options: Options given as arguments, used for the parameters that are not given.
+    :param query: Query parameters: start, end, m, top, search, ignore and case.
+    :return: Options.
+    """
+    start_date = datetime.date.fromisoformat(query["start"]) if query.get("start") else options.start_date
+    end_date = datetime.date.fromisoformat(query["end"]) if query.get("end") else options.end_date
+    return Args.Options(file_name=options.file_name,
+                        ignored_stats=query["ignore"].split(",") if query.get("ignore") else options.ignored_stats,
+                        searched_stats=query["search"].split(",") if query.get("search") else options.searched_stats,
+                        case_insensitive=query.get("case") == "1" or options.case_insensitive,
+                        minimum_labeling_percentage=float(query["m"]) if query.get("m")
+                        else options.minimum_labeling_percentage,
+                        top_labels=int(query["top"]) if query.get("top") else options.top_labels,
+                        start_date=start_date,
+                        end_date=end_date,
+                        cache=options.cache,
+                        colors_file_name=options.colors_file_name)
+
+
+@Profiling.Stage("aggregate")
+def aggregate(export: Data.Export, type_: Data.StatsType, options: Args.Options, period: str) -> dict:
+    """Filter and group stats of a date range using the cumulative hours of the whole file.
+
+    The result is the same as from Data.analyze, but only the hours of each period are calculated.
+
+    :param export: Dates and stats of all types with cumulative hours calculated.
+    :param type_: Type of the stats.
+    :param options: Options with the date range, the labels, the minimum labeling percentage and the top labels.
+    :param period: Length of the periods in the graphs: day, week or month.
+    :return: First day of each period, labels, colors, hours of each label in each period and total hours of each label.
+    """
+    stats = export.stats[type_]
+    start_index, end_index = Data.date_range_indices(export.dates, options.start_date, options.end_date)
+
+    # Included labels with time in the date range
+    total_hours = stats.total_hours(start_index, end_index)
+    rows = np.array([index for index, label in enumerate(stats.labels)
+                     if total_hours[index] > 0.0 and Data.is_label_included(label, options)], dtype=np.intp)
+    labels = [stats.labels[index] for index in rows]
+
+    # Labels with low percentage or outside the labels with the most time are grouped under the label Other
+    grouped = Data.find_grouped_labels(labels, total_hours[rows], options.minimum_labeling_percentage,
+                                       options.top_labels)
+
+    # Hours of each period from the differences of the cumulative hours at the period boundaries
+    period_starts, boundaries = Data.period_boundaries(export.dates[start_index:end_index], period)
+    cumulative_hours = stats.cumulative_hours()[:, boundaries + start_index]
+    hours = np.diff(cumulative_hours[rows], axis=1)
+
+    labels = [label for label, group in zip(labels, grouped) if not group]
+    if grouped.any():
+        other_hours = hours[grouped].sum(axis=0)
+        hours = hours[~grouped]
+        if "Other" in labels:
+            hours[labels.index("Other")] += other_hours
+        else:
+            labels.append("Other")
+            hours = np.vstack((hours, other_hours))
+
+    # Most commonly used first
+    totals = hours.sum(axis=1)
+    order = np.argsort(-totals, kind="stable")
+    palette = Palette.get(type_, options.colors_file_name, options.cache)
+
+    return {"dates": np.datetime_as_string(period_starts, unit="D").tolist(),
+            "labels": [labels[index] for index in order],
+            "colors": [palette.color(labels[index]) for index in order],
+            "hours": hours[order].round(4).tolist(),
+            "totals": totals[order].round(4).tolist()}
+
+
+def serve(options: Args.Options) -> None:
+    """Serve the stats until interrupted.
+
+    :param options: Options given as arguments. FILE is the directory of the files, or a single file.
+    """
+    server = Server(options)
+
+    async def run() -> None:
+        async with await asyncio.start_server(server.handle, host, options.port) as tcp_server:
+            print("Serving {0} at http://{1}:{2}/. Press Ctrl+C to stop.".format(options.file_name, host,
+                                                                                   options.port))
+            await tcp_server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
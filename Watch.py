@@ -0,0 +1,282 @@
+import collections
+import dataclasses
+import datetime
+import hashlib
+import os
+import time
+import typing
+
+import numpy as np
+
+import Args
+import Data
+import History
+import Plotting
+import Profiling
+import Reader
+
+
+# The file is checked this often, and it has to stay unchanged this long before it is read, in seconds
+poll_interval: float = 1.0
+settle_time: float = 2.0
+
+
+@dataclasses.dataclass
+class WatchedFile:
+    """Data class for storing the stats of a watched file and what is needed for reading only its changed days.
+
+    The days before the last few are expected to stay the same. They are read again only if the part of the file
+    before the last few days changes.
+
+    :ivar file_path: WakaTime JSON file path or history store path.
+    :ivar export: Dates and stats of all types.
+    :ivar tail_offset: Position of the first of the last few days in the file in characters.
+    :ivar head_digest: Hash of the file before the last few days.
+    :ivar tail_dates: Dates of the last few days as proleptic Gregorian ordinals.
+    :ivar compact: Whether to store the hours as 32-bit floats.
+    """
+    file_path: str
+    export: Data.Export = dataclasses.field(default_factory=Data.Export)
+    tail_offset: int = 0
+    head_digest: str = ""
+    tail_dates: np.ndarray = dataclasses.field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    compact: bool = False
+
+
+class HashingFile:
+    """Text file that hashes the characters read from it up to a position that moves forward while it is read.
+
+    The characters after the position are kept until the position moves past them, so the file has to be read only
+    once even though the position is known only after the characters have been read.
+
+    :ivar file: Opened text file.
+    :ivar digest: Hash of the characters before the position.
+    :ivar position: Number of characters hashed.
+    :ivar pending: Characters read from the file but not hashed yet.
+    """
+
+    def __init__(self, file: typing.TextIO, digest: hashlib.blake2b, position: int) -> None:
+        """Initialize the file.
+
+        :param file: Opened text file.
+        :param digest: Hash of the characters already read from the file.
+        :param position: Number of characters already read from the file.
+        """
+        self.file = file
+        self.digest = digest
+        self.position = position
+        self.pending = ""
+
+    def read(self, size: int = -1) -> str:
+        """Read characters from the file.
+
+        :param size: Maximum number of characters to read, or -1 to read to the end of the file.
+        :return: Characters read, or an empty string at the end of the file.
+        """
+        text = self.file.read(size)
+        self.pending += text
+        return text
+
+    def __iter__(self) -> "HashingFile":
+        return self
+
+    def __next__(self) -> str:
+        """Read the next line from the file.
+
+        :return: Line with its line break.
+        """
+        line = next(self.file)
+        self.pending += line
+        return line
+
+    def hash_to(self, position: int) -> None:
+        """Hash the characters up to a position.
+
+        :param position: Number of characters from the start of the file. Must be read already.
+        """
+        length = position - self.position
+        if length > 0:
+            self.digest.update(self.pending[:length].encode("utf-8"))
+            self.pending = self.pending[length:]
+            self.position = position
+
+
+def read_digest(file: typing.TextIO, length: int) -> hashlib.blake2b | None:
+    """Calculate a hash of the beginning of a file.
+
+    :param file: File opened in text mode and positioned at its start.
+    :param length: Number of characters to read.
+    :return: Hash that more characters can be added to, or None if the file is shorter than the given length.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    while length > 0:
+        text = file.read(min(length, 1024 ** 2))
+        if text == "":
+            return None
+        digest.update(text.encode("utf-8"))
+        length -= len(text)
+    return digest
+
+
+def read_tail(watched_file: WatchedFile, days: typing.Iterable[dict], offsets: collections.deque,
+              file: HashingFile) -> Data.Export:
+    """Parse days and move the last few days to start after the days that were parsed.
+
+    Only the dates and positions of the last few days are kept, so the days are parsed one at a time.
+
+    :param watched_file: Watched file to update. Its split is kept if too few days were parsed to move it.
+    :param days: Days to parse, read from the file.
+    :param offsets: Deque with the length of the last few days that the reader appends the position of each day to.
+    :param file: File the days are read from, hashing the characters before the last few days.
+    :return: Stats of the parsed days.
+    """
+    dates = collections.deque(maxlen=offsets.maxlen)
+    day_count = 0
+
+    def track_days() -> typing.Iterator[dict]:
+        nonlocal day_count
+        for day in days:
+            dates.append(Data.string_to_date(day["date"]).toordinal())
+            day_count += 1
+
+            # The last few days start at the earliest from the first day in the deque
+            if len(offsets) == offsets.maxlen:
+                file.hash_to(offsets[0])
+            yield day
+
+    export = Data.parse_days(track_days(), watched_file.compact)
+
+    if day_count > History.lookback_days:
+        file.hash_to(offsets[0])
+        watched_file.tail_offset = offsets[0]
+        watched_file.head_digest = file.digest.hexdigest()
+        watched_file.tail_dates = np.array(dates, dtype=np.int64)
+    return export
+
+
+@Profiling.Stage("read_watched_file")
+def read_watched_file(file_path: str, compact: bool = False) -> WatchedFile:
+    """Read all days of a file.
+
+    :param file_path: WakaTime JSON file path or history store path.
+    :param compact: Whether to store the hours as 32-bit floats.
+    :return: Stats of the file.
+    """
+    watched_file = WatchedFile(file_path, compact=compact)
+    offsets = collections.deque(maxlen=History.lookback_days)
+    with Reader.open_file(file_path) as (file, name):
+        hashing_file = HashingFile(file, hashlib.blake2b(digest_size=20), 0)
+        watched_file.export = read_tail(watched_file, Reader.read_opened_days(hashing_file, name, offsets), offsets,
+                                        hashing_file)
+    return watched_file
+
+
+@Profiling.Stage("update_watched_file")
+def update_watched_file(watched_file: WatchedFile) -> tuple[WatchedFile, int]:
+    """Read the days of a changed file that may have changed.
+
+    If the part of the file before the last few days has not changed, only the days after it are read and the rest of
+    the stats are kept. Otherwise the whole file is read again. The part before the last few days is hashed only once.
+
+    :param watched_file: Stats of the file before it changed.
+    :return: Stats of the changed file and the number of days that were read.
+    """
+    with Reader.open_file(watched_file.file_path) as (file, name):
+        digest = read_digest(file, watched_file.tail_offset) if watched_file.tail_offset > 0 else None
+        head_changed = digest is None or digest.hexdigest() != watched_file.head_digest
+
+        # Hash the days read again after the part that did not change, up to the new last few days
+        if not head_changed:
+            updated_file = dataclasses.replace(watched_file)
+            offsets = collections.deque(maxlen=History.lookback_days)
+            hashing_file = HashingFile(file, digest, watched_file.tail_offset)
+            tail_export = read_tail(updated_file, Reader.read_days_after(hashing_file, name, watched_file.tail_offset,
+                                                                         offsets), offsets, hashing_file)
+
+    # The part before the last few days changed
+    if head_changed:
+        watched_file = read_watched_file(watched_file.file_path, watched_file.compact)
+        return watched_file, len(watched_file.export.dates)
+
+    # Keep the columns of the days before the last few days and replace the rest with the days read again
+    head = ~np.isin(watched_file.export.dates, watched_file.tail_dates)
+    head_export = Data.Export(dates=watched_file.export.dates[head])
+    for type_, stats in watched_file.export.stats.items():
+        head_export.stats[type_] = Data.Stats(type_)
+        head_export.stats[type_].set_rows(stats.labels, stats.hours[:, head])
+
+    updated_file.export = Data.merge_exports([head_export, tail_export])
+    return updated_file, len(tail_export.dates)
+
+
+def render(watched_file: WatchedFile, options: Args.Options) -> None:
+    """Write the output requested in the options for the stats of a watched file.
+
+    :param watched_file: Stats of the file.
+    :param options: Options given as arguments.
+    """
+    analysis = Data.analyze(watched_file.export, options)
+
+    # Print total times for each period
+    if options.breakdown != "":
+        for stats in analysis.stats.values():
+            print(Data.format_breakdown(analysis, stats, options.breakdown), end="\n\n")
+
+    # Write HTML file or images
+    else:
+        Plotting.plot(analysis)
+
+
+def file_status(file_path: str) -> tuple[int, int] | None:
+    """Get what is compared to notice that a file has changed.
+
+    :param file_path: File path.
+    :return: Size and modification time of the file, or None if the file does not exist.
+    """
+    try:
+        status = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return status.st_size, status.st_mtime_ns
+
+
+def watch(options: Args.Options) -> None:
+    """Write the output for a file and write it again whenever the file changes, until interrupted.
+
+    :param options: Options given as arguments.
+    """
+    watched_file = read_watched_file(options.file_name, options.compact)
+    render(watched_file, options)
+    status = file_status(options.file_name)
+    print("Watching {0}. Press Ctrl+C to stop.".format(options.file_name))
+
+    try:
+        while True:
+            time.sleep(poll_interval)
+            new_status = file_status(options.file_name)
+            if new_status is None or new_status == status:
+                continue
+
+            # Wait until the file stops changing so that a file that is still being written is not read
+            while True:
+                time.sleep(settle_time)
+                settled_status = file_status(options.file_name)
+                if settled_status == new_status:
+                    break
+                new_status = settled_status
+            if new_status is None:
+                continue
+            status = new_status
+
+            try:
+                watched_file, day_count = update_watched_file(watched_file)
+            except (OSError, EOFError, ValueError) as error:
+                # File is read again when it changes the next time
+                print("Could not read {0}: {1}".format(options.file_name, error))
+                continue
+
+            render(watched_file, options)
+            print("{0}: read {1} days of {2} again.".format(datetime.datetime.now().strftime("%H:%M:%S"), day_count,
+                                                          options.file_name))
+    except KeyboardInterrupt:
+        pass